@@ -0,0 +1,154 @@
+"""Vectorized bounding box conversion between VOC, YOLO and COCO formats.
+
+Boxes are converted as (N, 4) arrays in a single NumPy operation, with the
+size of the image of every box as an (N, 2) array or a single (2,) size, so
+converting a dataset costs a few array operations per chunk of annotations
+rather than Python arithmetic per box.
+
+- VOC: (xmin, ymin, xmax, ymax) in pixels.
+- YOLO: (x_center, y_center, width, height) relative to the image size.
+- COCO: (x, y, width, height) in pixels.
+"""
+
+import xml.etree.ElementTree as ET
+from typing import NamedTuple, Sequence
+
+import numpy as np
+
+VOC_COORDINATES = ("xmin", "ymin", "xmax", "ymax")
+
+
+class VocAnnotation(NamedTuple):
+    """Objects of a PASCAL VOC annotation, with boxes in pixels."""
+
+    filename: str
+    width: int
+    height: int
+    class_ids: list[int]
+    boxes: list[tuple[float, float, float, float]]
+
+
+def class_id_map(classes: Sequence[str]) -> dict[str, int]:
+    """Class id of every class name.
+
+    :param classes: A list of class names as strings.
+    :return: Class id per class name, the first one if a name is repeated.
+    """
+    class_map = {}
+    for class_id, class_name in enumerate(classes):
+        class_map.setdefault(class_name, class_id)
+    return class_map
+
+
+def voc_to_yolo(boxes: np.ndarray, sizes: np.ndarray) -> np.ndarray:
+    """Convert VOC boxes to YOLO boxes.
+
+    :param boxes: Array of shape (N, 4) of VOC boxes.
+    :param sizes: Array of shape (N, 2) of image (width, height) per box, or
+        of shape (2,) for boxes of a single image size.
+    :return: Array of shape (N, 4) of YOLO boxes.
+    """
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    mins, maxs = boxes[:, :2], boxes[:, 2:]
+    scale = 1.0 / np.asarray(sizes, dtype=np.float64)
+    return np.hstack(((mins + maxs) / 2.0 * scale, (maxs - mins) * scale))
+
+
+def yolo_to_voc(boxes: np.ndarray, sizes: np.ndarray) -> np.ndarray:
+    """Convert YOLO boxes to VOC boxes.
+
+    :param boxes: Array of shape (N, 4) of YOLO boxes.
+    :param sizes: Array of shape (N, 2) of image (width, height) per box, or
+        of shape (2,) for boxes of a single image size.
+    :return: Array of shape (N, 4) of VOC boxes, in fractional pixels.
+    """
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    sizes = np.asarray(sizes, dtype=np.float64)
+    extents = boxes[:, 2:] * sizes
+    mins = boxes[:, :2] * sizes - extents / 2.0
+    return np.hstack((mins, mins + extents))
+
+
+def voc_to_coco(boxes: np.ndarray) -> np.ndarray:
+    """Convert VOC boxes to COCO boxes.
+
+    :param boxes: Array of shape (N, 4) of VOC boxes.
+    :return: Array of shape (N, 4) of COCO boxes.
+    """
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    return np.hstack((boxes[:, :2], boxes[:, 2:] - boxes[:, :2]))
+
+
+def parse_voc_annotation(
+    root: ET.Element, class_map: dict[str, int]
+) -> VocAnnotation:
+    """Read the objects of a parsed PASCAL VOC annotation.
+
+    Objects of unknown classes and difficult objects are left out.
+
+    :param root: Root element of the annotation.
+    :param class_map: Class id per class name.
+    :return: Image file name and size, and class id and box of every object.
+    :raises ValueError: If the image size is not positive.
+    """
+    size_element = root.find("size")
+    width = int(size_element.find("width").text)
+    height = int(size_element.find("height").text)
+    if width <= 0 or height <= 0:
+        raise ValueError(f"Invalid image size {width}x{height}.")
+
+    class_ids = []
+    boxes = []
+    for obj in root.iter("object"):
+        is_difficult = obj.find("difficult").text
+        class_id = class_map.get(obj.find("name").text)
+        if class_id is None or int(is_difficult) == 1:
+            continue
+        xml_box = obj.find("bndbox")
+        class_ids.append(class_id)
+        boxes.append(
+            tuple(float(xml_box.find(name).text) for name in VOC_COORDINATES)
+        )
+
+    return VocAnnotation(
+        root.findtext("filename", ""), width, height, class_ids, boxes
+    )
+
+
+def stack_boxes(
+    annotations: Sequence[VocAnnotation],
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Stack the boxes of annotations into arrays.
+
+    :param annotations: Parsed annotations.
+    :return: Array of shape (N, 4) of the boxes, array of shape (N, 2) of the
+        image size of every box, and the offsets of the first box of every
+        annotation, followed by N.
+    """
+    counts = [len(annotation.boxes) for annotation in annotations]
+    offsets = np.zeros(len(annotations) + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    boxes = np.array(
+        [box for annotation in annotations for box in annotation.boxes],
+        dtype=np.float64,
+    ).reshape(-1, 4)
+    image_sizes = np.array(
+        [(annotation.width, annotation.height) for annotation in annotations],
+        dtype=np.float64,
+    ).reshape(-1, 2)
+    return boxes, np.repeat(image_sizes, counts, axis=0), offsets
+
+
+def annotations_to_yolo(
+    annotations: Sequence[VocAnnotation],
+) -> list[list[list[float]]]:
+    """Convert the boxes of many annotations to YOLO in one operation.
+
+    :param annotations: Parsed annotations.
+    :return: YOLO boxes of every annotation.
+    """
+    boxes, sizes, offsets = stack_boxes(annotations)
+    yolo_boxes = voc_to_yolo(boxes, sizes).tolist()
+    return [
+        yolo_boxes[start:end] for start, end in zip(offsets[:-1], offsets[1:])
+    ]
@@ -1,8 +1,52 @@
-"""Convert dataset from PASCAL VOC XML format to YOLO format."""
+"""Convert dataset from PASCAL VOC XML format to YOLO format.
+
+A manifest of the converted inputs is kept in the output directory, so that
+a rerun only converts new or changed annotations, removes the outputs of
+deleted ones, and reconverts everything when the classes change. The
+manifest records the input directory, so that converting another directory
+into the same output directory does not remove the outputs of the first.
+
+The annotations can also be read from a zip or tar archive without
+extracting it, and the labels written to a single archive, to tar shards or
+to a memory-mappable binary label store.
+"""
 
 import argparse
+import hashlib
+import json
+import os
+import time
 import xml.etree.ElementTree as ET
-from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from functools import partial
+from pathlib import Path, PurePosixPath
+from typing import Iterable, Iterator, Optional
+
+from bbox_formats import (
+    VocAnnotation,
+    annotations_to_yolo,
+    class_id_map,
+    parse_voc_annotation,
+)
+from label_archives import (
+    LabelWriter,
+    format_labels,
+    is_label_directory,
+    iter_archive_members,
+    open_label_writer,
+)
+from parallel_map import map_bounded, split_chunks
+
+CHUNK_SIZE = 256
+# Annotations may also be XML files with a .txt suffix.
+ANNOTATION_SUFFIXES = (".xml", ".txt")
+MAX_REPORTED_ERRORS = 20
+MANIFEST_NAME = ".voc_to_yolo_manifest.json"
+MANIFEST_VERSION = 2
+
+# Label file path, and the class id and YOLO box of every object.
+Label = tuple[str, list[int], list[list[float]]]
 
 
 def convert_bbox_to_yolo(
@@ -25,66 +69,529 @@ def convert_bbox_to_yolo(
     return (rel_x_center, rel_y_center, rel_width, rel_height)
 
 
-def xml_to_txt(input_file: Path, output_txt: Path, classes: list[str]) -> None:
+@dataclass
+class ConversionReport:
+    """Summary of a dataset conversion."""
+
+    files: int = 0
+    objects: int = 0
+    skipped: int = 0
+    removed: int = 0
+    seconds: float = 0.0
+    errors: list[tuple[Path, str]] = field(default_factory=list)
+    manifest: dict[str, dict[str, int | str]] = field(default_factory=dict)
+
+    @property
+    def files_per_second(self) -> float:
+        """Converted files per second."""
+        return self.files / self.seconds if self.seconds else 0.0
+
+    def add(self, other: "ConversionReport") -> None:
+        """Add the counts and errors of another report.
+
+        :param other: Report of a part of the dataset.
+        """
+        self.files += other.files
+        self.objects += other.objects
+        self.errors.extend(other.errors)
+        self.manifest.update(other.manifest)
+
+
+def file_hash(file_path: Path) -> str:
+    """Hash of the content of a file.
+
+    :param file_path: File path.
+    :return: Hexadecimal BLAKE2b digest.
+    """
+    return hashlib.blake2b(file_path.read_bytes(), digest_size=16).hexdigest()
+
+
+def classes_hash(classes: list[str]) -> str:
+    """Hash of the class names, changing whenever the class ids change.
+
+    :param classes: A list of class names as strings.
+    :return: Hexadecimal BLAKE2b digest.
+    """
+    content = "\n".join(classes).encode()
+    return hashlib.blake2b(content, digest_size=16).hexdigest()
+
+
+def file_state(file_path: Path) -> dict[str, int | str]:
+    """Modification time, size and hash of a file.
+
+    :param file_path: File path.
+    :return: Manifest entry of the file.
+    """
+    stat = file_path.stat()
+    return {
+        "mtime_ns": stat.st_mtime_ns,
+        "size": stat.st_size,
+        "hash": file_hash(file_path),
+    }
+
+
+def load_manifest(output_dir: Path) -> dict:
+    """Load the manifest of a previous conversion.
+
+    :param output_dir: Directory of the converted .txt files.
+    :return: Manifest with the input directory, the class names hash and the
+        entries per input file name, empty if there is no valid manifest.
+    """
+    try:
+        manifest = json.loads(
+            (output_dir / MANIFEST_NAME).read_text(encoding="utf-8")
+        )
+    except (OSError, ValueError):
+        return {}
+
+    if manifest.get("version") != MANIFEST_VERSION:
+        return {}
+    return manifest
+
+
+def save_manifest(
+    output_dir: Path,
+    input_dir: Path,
+    classes: list[str],
+    files: dict[str, dict],
+) -> None:
+    """Write the manifest atomically, so an interrupted run leaves it valid.
+
+    :param output_dir: Directory of the converted .txt files.
+    :param input_dir: Directory containing the input XML files.
+    :param classes: A list of class names as strings.
+    :param files: Manifest entries per input file name.
+    """
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "input_dir": str(input_dir.resolve()),
+        "classes_hash": classes_hash(classes),
+        "files": dict(sorted(files.items())),
+    }
+    manifest_path = output_dir / MANIFEST_NAME
+    temp_path = manifest_path.with_suffix(".tmp")
+    temp_path.write_text(json.dumps(manifest), encoding="utf-8")
+    os.replace(temp_path, manifest_path)
+
+
+def is_unchanged(
+    input_file: Path, output_txt: Path, entry: Optional[dict]
+) -> bool:
+    """Whether an input is unchanged since it was converted.
+
+    The hash is only computed when the modification time or size differ, to
+    recognise files that were touched or copied without being changed, in
+    which case the modification time of the entry is updated.
+
+    :param input_file: Path to the input XML file.
+    :param output_txt: Path to the output .txt file.
+    :param entry: Manifest entry of the input, if it was converted before.
+    :return: True if the input does not need to be converted again.
+    """
+    if entry is None or not output_txt.exists():
+        return False
+    stat = input_file.stat()
+    if stat.st_mtime_ns == entry["mtime_ns"] and stat.st_size == entry["size"]:
+        return True
+    if (
+        stat.st_size == entry["size"]
+        and file_hash(input_file) == entry["hash"]
+    ):
+        entry["mtime_ns"] = stat.st_mtime_ns
+        return True
+    return False
+
+
+def annotation_to_yolo(
+    root: ET.Element, class_map: dict[str, int]
+) -> tuple[list[int], list[list[float]]]:
+    """Convert a parsed PASCAL VOC annotation to YOLO labels.
+
+    :param root: Root element of the annotation.
+    :param class_map: Class id per class name.
+    :return: Class id and YOLO box of every object.
+    """
+    annotation = parse_voc_annotation(root, class_map)
+    (boxes,) = annotations_to_yolo([annotation])
+    return annotation.class_ids, boxes
+
+
+def read_annotation(input_file: Path) -> ET.Element:
+    """Parse an XML annotation file.
+
+    :param input_file: Path to the input XML file.
+    :return: Root element of the annotation.
+    :raises ET.ParseError: If the file is not valid XML.
+    """
+    if input_file.suffix == ".txt":
+        # Attempt to parse the file content as XML
+        with input_file.open("r", encoding="utf-8") as file:
+            file_content = file.read()
+        return ET.fromstring(file_content)
+    return ET.parse(input_file).getroot()
+
+
+def xml_to_txt(input_file: Path, output_txt: Path, classes: list[str]) -> int:
     """Parse an XML file in PASCAL VOC format and convert it to YOLO format.
 
-    :param input_xml: Path to the input XML file.
+    :param input_file: Path to the input XML file.
     :param output_txt: Path to the output .txt file in YOLO format.
     :param classes: A list of class names as strings.
+    :return: Number of objects written.
+    :raises ET.ParseError: If the file is not valid XML.
     """
-    if input_file.suffix == ".txt":
+    class_ids, boxes = annotation_to_yolo(
+        read_annotation(input_file), class_id_map(classes)
+    )
+    with output_txt.open("w") as file:
+        file.write(format_labels(class_ids, boxes))
+
+    return len(class_ids)
+
+
+def convert_files(
+    input_files: list[Path], output_dir: Path, classes: list[str]
+) -> ConversionReport:
+    """Convert annotation files, collecting the errors instead of stopping.
+
+    The files are parsed one by one and the boxes of all of them converted
+    in a single array operation.
+
+    :param input_files: Paths to the input XML files.
+    :param output_dir: Directory to save the converted .txt files.
+    :param classes: A list of class names as strings.
+    :return: Report of the converted files.
+    """
+    report = ConversionReport()
+    class_map = class_id_map(classes)
+    parsed_files = []
+    annotations = []
+    for input_file in input_files:
         try:
-            # Attempt to parse the file content as XML
-            with input_file.open("r", encoding="utf-8") as file:
-                file_content = file.read()
-            root = ET.fromstring(file_content)
-        except ET.ParseError as e:
-            print(f"Error parsing {input_file}: {e}")
-            return  # Skip this file and continue with the next
-    else:
+            annotation = parse_voc_annotation(
+                read_annotation(input_file), class_map
+            )
+        # A malformed annotation is reported and skipped, whatever the error.
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            report.errors.append((input_file, f"{type(e).__name__}: {e}"))
+            continue
+        parsed_files.append(input_file)
+        annotations.append(annotation)
+
+    yolo_boxes = annotations_to_yolo(annotations)
+    for input_file, annotation, boxes in zip(
+        parsed_files, annotations, yolo_boxes
+    ):
+        output_txt = output_dir / input_file.with_suffix(".txt").name
         try:
-            tree = ET.parse(input_file)
-            root = tree.getroot()
-        except ET.ParseError as e:
-            print(f"Error parsing {input_file}: {e}")
-            return  # Skip this file and continue with the next
+            output_txt.write_text(format_labels(annotation.class_ids, boxes))
+        except OSError as e:
+            report.errors.append((input_file, f"{type(e).__name__}: {e}"))
+            continue
+        report.files += 1
+        report.objects += len(annotation.class_ids)
+        report.manifest[input_file.name] = file_state(input_file)
 
-    size_element = root.find("size")
-    image_width = int(size_element.find("width").text)
-    image_height = int(size_element.find("height").text)
+    return report
 
-    with output_txt.open("w") as file:
-        for obj in root.iter("object"):
-            is_difficult = obj.find("difficult").text
-            class_name = obj.find("name").text
-            if class_name not in classes or int(is_difficult) == 1:
-                continue
-            class_id = classes.index(class_name)
-            xml_box = obj.find("bndbox")
-            bbox = (
-                float(xml_box.find("xmin").text),
-                float(xml_box.find("ymin").text),
-                float(xml_box.find("xmax").text),
-                float(xml_box.find("ymax").text),
+
+def parse_annotations(
+    annotations: Iterable[tuple[str, bytes]],
+    class_map: dict[str, int],
+    report: ConversionReport,
+) -> tuple[list[str], list[VocAnnotation]]:
+    """Parse annotations held in memory, collecting the errors in a report.
+
+    :param annotations: Names and contents of the XML annotations.
+    :param class_map: Class id per class name.
+    :param report: Report to add the errors to.
+    :return: Names and parsed annotations of the valid annotations.
+    """
+    names = []
+    parsed = []
+    for name, content in annotations:
+        try:
+            annotation = parse_voc_annotation(
+                ET.fromstring(content), class_map
             )
-            yolo_bbox = convert_bbox_to_yolo((image_width, image_height), bbox)
-            file.write(f"{class_id} {' '.join(map(str, yolo_bbox))}\n")
+        # A malformed annotation is reported and skipped, whatever the error.
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            report.errors.append((Path(name), f"{type(e).__name__}: {e}"))
+            continue
+        names.append(name)
+        parsed.append(annotation)
+    return names, parsed
 
 
-def main(input_dir: Path, output_dir: Path, classes_file: Path) -> None:
-    """Convert dataset main function.
+def convert_annotations(
+    annotations: list[tuple[str, bytes]], classes: list[str]
+) -> tuple[list[Label], ConversionReport]:
+    """Convert annotations held in memory to YOLO labels.
 
-    :param input_xml: Path to the input XML file.
-    :param output_txt: Path to the output .txt file in YOLO format.
+    :param annotations: Names and contents of the XML annotations.
     :param classes: A list of class names as strings.
+    :return: Label file paths, relative like the annotations, class ids
+        and boxes, and a report of the conversion.
     """
-    classes = classes_file.read_text().splitlines()
+    report = ConversionReport()
+    names, parsed = parse_annotations(
+        annotations, class_id_map(classes), report
+    )
+    labels = []
+    for name, annotation, boxes in zip(
+        names, parsed, annotations_to_yolo(parsed)
+    ):
+        label_name = PurePosixPath(name).with_suffix(".txt").as_posix()
+        labels.append((label_name, annotation.class_ids, boxes))
+        report.files += 1
+        report.objects += len(annotation.class_ids)
+
+    return labels, report
+
+
+def iter_annotations(input_path: Path) -> Iterator[tuple[str, bytes]]:
+    """Stream the annotations of a directory or an archive.
+
+    :param input_path: Directory containing the input XML files, or a zip or
+        tar archive of them.
+    :return: Iterator over the annotation names and contents.
+    """
+    if input_path.is_dir():
+        for path in sorted(input_path.glob("*")):
+            if path.is_file():
+                yield path.name, path.read_bytes()
+    else:
+        yield from iter_archive_members(input_path, ANNOTATION_SUFFIXES)
+
+
+def _write_labels(
+    writer: LabelWriter,
+    results: Iterable[tuple[list[Label], ConversionReport]],
+    report: ConversionReport,
+) -> None:
+    """Write converted chunks of labels and add up their reports.
 
+    :param writer: Destination of the label files.
+    :param results: Labels and report of every chunk.
+    :param report: Report of the whole conversion.
+    :raises ValueError: If two annotations have the same label file path.
+    """
+    written = set()
+    for labels, chunk_report in results:
+        for name, class_ids, boxes in labels:
+            if name in written:
+                raise ValueError(f"Several annotations have labels {name}.")
+            written.add(name)
+            writer.write(name, class_ids, boxes)
+        report.add(chunk_report)
+
+
+def convert_archive(
+    input_path: Path,
+    output_path: Path,
+    classes: list[str],
+    workers: Optional[int] = None,
+    chunk_size: int = CHUNK_SIZE,
+    shards: Optional[int] = None,
+) -> ConversionReport:
+    """Convert the annotations of an archive, or into an archive.
+
+    The annotations are read sequentially, converted in chunks by the worker
+    processes, and the labels are written in input order. Nothing is
+    extracted to disk, and without a manifest every annotation is converted.
+    The output is only completed if the whole conversion succeeds.
+
+    :param input_path: Directory containing the input XML files, or a zip or
+        tar archive of them.
+    :param output_path: Directory, zip or tar archive, or .labels store to
+        write the labels to.
+    :param classes: A list of class names as strings.
+    :param workers: Number of worker processes, one per CPU if not given,
+        and no pool if 1.
+    :param chunk_size: Number of files sent to a worker at once.
+    :param shards: Number of tar shards to write into the output directory.
+    :return: Report of the conversion.
+    """
+    start = time.perf_counter()
+    report = ConversionReport()
+    chunks = split_chunks(iter_annotations(input_path), chunk_size)
+    convert_chunk = partial(convert_annotations, classes=classes)
+
+    writer = open_label_writer(output_path, classes, shards)
+    try:
+        if workers == 1:
+            _write_labels(writer, map(convert_chunk, chunks), report)
+        else:
+            window = 2 * (workers or os.cpu_count() or 1)
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                results = map_bounded(executor, convert_chunk, chunks, window)
+                _write_labels(writer, results, report)
+    except BaseException:
+        # A failed run must not replace a previous output with a partial one.
+        writer.abort()
+        raise
+    writer.close()
+
+    report.seconds = time.perf_counter() - start
+    return report
+
+
+def convert_dataset(
+    input_dir: Path,
+    output_dir: Path,
+    classes: list[str],
+    workers: Optional[int] = None,
+    chunk_size: int = CHUNK_SIZE,
+    force: bool = False,
+) -> ConversionReport:
+    """Convert the new and changed annotation files of a directory.
+
+    The files are distributed to the workers in chunks, so that the cost of
+    sending work to a process is shared by many small files. Outputs whose
+    input was deleted, or no longer converts, are removed, unless the
+    previous conversion into the output directory was of another input
+    directory, whose outputs are left alone.
+
+    :param input_dir: Directory containing the input XML files.
+    :param output_dir: Directory to save the converted .txt files.
+    :param classes: A list of class names as strings.
+    :param workers: Number of worker processes, one per CPU if not given,
+        and no pool if 1.
+    :param chunk_size: Number of files sent to a worker at once.
+    :param force: Convert all files, even if they are unchanged.
+    :return: Report of the conversion.
+    :raises ValueError: If two input files have the same output file, e.g.
+        a.txt and a.xml.
+    """
+    start = time.perf_counter()
     output_dir.mkdir(parents=True, exist_ok=True)
+    input_files = sorted(
+        path for path in input_dir.glob("*") if path.is_file()
+    )
+    output_inputs = {}
+    for input_file in input_files:
+        output_name = input_file.with_suffix(".txt").name
+        if output_name in output_inputs:
+            raise ValueError(
+                f"{output_inputs[output_name]} and {input_file.name} are "
+                f"both converted to {output_name}."
+            )
+        output_inputs[output_name] = input_file.name
+    # The previous inputs are kept even when everything is converted again,
+    # so that the outputs of deleted inputs are still removed.
+    previous_manifest = load_manifest(output_dir)
+    previous = {}
+    if previous_manifest.get("input_dir") == str(input_dir.resolve()):
+        previous = previous_manifest["files"]
+    reuse = not force and previous_manifest.get(
+        "classes_hash"
+    ) == classes_hash(classes)
+
+    manifest = {}
+    pending = []
+    for input_file in input_files:
+        entry = previous.get(input_file.name) if reuse else None
+        output_txt = output_dir / input_file.with_suffix(".txt").name
+        if is_unchanged(input_file, output_txt, entry):
+            manifest[input_file.name] = entry
+        else:
+            pending.append(input_file)
+
+    removed = 0
+    input_names = set(output_inputs.values())
+    for name in previous.keys() - input_names:
+        output_name = Path(name).with_suffix(".txt").name
+        # A new input may have taken the output, e.g. a.txt for a.xml.
+        if output_name not in output_inputs:
+            (output_dir / output_name).unlink(missing_ok=True)
+            removed += 1
+
+    if workers == 1:
+        report = convert_files(pending, output_dir, classes)
+    else:
+        report = ConversionReport()
+        convert_chunk = partial(
+            convert_files, output_dir=output_dir, classes=classes
+        )
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(convert_chunk, chunk)
+                for chunk in split_chunks(pending, chunk_size)
+            ]
+            for future in as_completed(futures):
+                report.add(future.result())
+        report.errors.sort()
+
+    # Labels of an annotation that no longer converts would be stale.
+    for input_file, _ in report.errors:
+        if input_file.name in previous:
+            output_txt = output_dir / input_file.with_suffix(".txt").name
+            output_txt.unlink(missing_ok=True)
+            removed += 1
+
+    manifest.update(report.manifest)
+    save_manifest(output_dir, input_dir, classes, manifest)
+    report.manifest = manifest
+    report.skipped = len(input_files) - len(pending)
+    report.removed = removed
+    report.seconds = time.perf_counter() - start
+    return report
 
-    for xml_file in input_dir.glob("*"):
-        output_txt_path = output_dir / xml_file.with_suffix(".txt").name
-        xml_to_txt(xml_file, output_txt_path, classes)
+
+def print_report(report: ConversionReport) -> None:
+    """Print the summary of a conversion.
+
+    :param report: Report of the conversion.
+    """
+    print(
+        f"Converted {report.files} files with {report.objects} objects in "
+        f"{report.seconds:.2f} s ({report.files_per_second:.0f} files/s)."
+    )
+    if report.skipped or report.removed:
+        print(
+            f"Skipped {report.skipped} unchanged files and removed "
+            f"{report.removed} outputs of deleted or invalid files."
+        )
+    if report.errors:
+        print(f"{len(report.errors)} files could not be converted:")
+        for input_file, error in report.errors[:MAX_REPORTED_ERRORS]:
+            print(f"  {input_file}: {error}")
+        if len(report.errors) > MAX_REPORTED_ERRORS:
+            print(f"  ... and {len(report.errors) - MAX_REPORTED_ERRORS} more")
+
+
+def main(
+    input_dir: Path,
+    output_dir: Path,
+    classes_file: Path,
+    workers: Optional[int] = 1,
+    chunk_size: int = CHUNK_SIZE,
+    force: bool = False,
+    shards: Optional[int] = None,
+) -> None:
+    """Convert dataset main function.
+
+    :param input_dir: Directory containing the input XML files, or a zip or
+        tar archive of them.
+    :param output_dir: Directory to save the converted .txt files, or a zip
+        or tar archive or .labels store to write them to.
+    :param classes_file: File containing class names, one per line.
+    :param workers: Number of worker processes, one per CPU if None.
+    :param chunk_size: Number of files sent to a worker at once.
+    :param force: Convert all files, even if they are unchanged.
+    :param shards: Number of tar shards to write the labels to.
+    """
+    classes = classes_file.read_text().splitlines()
+
+    if input_dir.is_dir() and is_label_directory(output_dir, shards):
+        report = convert_dataset(
+            input_dir, output_dir, classes, workers, chunk_size, force
+        )
+    else:
+        report = convert_archive(
+            input_dir, output_dir, classes, workers, chunk_size, shards
+        )
+    print_report(report)
 
 
 if __name__ == "__main__":
@@ -92,16 +599,54 @@ if __name__ == "__main__":
         description="Convert XML dataset to YOLO format"
     )
     parser.add_argument(
-        "input_dir", type=Path, help="Directory containing input XML files"
+        "input_dir",
+        type=Path,
+        help="Directory containing input XML files, or a zip or tar archive",
     )
     parser.add_argument(
-        "output_dir", type=Path, help="Directory to save converted .txt files"
+        "output_dir",
+        type=Path,
+        help=(
+            "Directory to save converted .txt files, or a .zip or .tar "
+            "archive or .labels store to write them to"
+        ),
     )
     parser.add_argument(
         "classes_file",
         type=Path,
         help="File containing class names, one per line",
     )
+    parser.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of worker processes, 0 for one per CPU",
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=CHUNK_SIZE,
+        help="Number of files sent to a worker at once",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Convert all files, even if they are unchanged",
+    )
+    parser.add_argument(
+        "--shards",
+        type=int,
+        help="Write the labels to this many tar files in the output directory",
+    )
 
     args = parser.parse_args()
-    main(args.input_dir, args.output_dir, args.classes_file)
+    main(
+        args.input_dir,
+        args.output_dir,
+        args.classes_file,
+        args.workers or None,
+        args.chunk_size,
+        args.force,
+        args.shards,
+    )
@@ -0,0 +1,391 @@
+"""Export annotations to COCO JSON and PASCAL VOC XML.
+
+PASCAL VOC annotations are exported to a single COCO JSON file, and YOLO
+labels to one PASCAL VOC XML file per image. The boxes of every chunk of
+annotations are converted in a single array operation, and the output is
+written from templates as it is converted, so that the export of a large
+dataset is bounded by reading and writing the files.
+"""
+
+import argparse
+import json
+import time
+from pathlib import Path, PurePosixPath
+from typing import Iterator, Optional
+from xml.sax.saxutils import escape
+
+import numpy as np
+from bbox_formats import (
+    class_id_map,
+    stack_boxes,
+    voc_to_coco,
+    yolo_to_voc,
+)
+from convert_voc_to_yolo import (
+    CHUNK_SIZE,
+    ConversionReport,
+    iter_annotations,
+    parse_annotations,
+    print_report,
+)
+from label_archives import iter_archive_members, relative_output_path
+from label_store import LABEL_STORE_SUFFIX, LabelStore, load_label_store
+from parallel_map import split_chunks
+
+COCO_ANNOTATION = (
+    '{{"id": {}, "image_id": {}, "category_id": {}, '
+    '"bbox": [{}, {}, {}, {}], "area": {}, "iscrowd": 0}}'
+)
+VOC_ANNOTATION = """<annotation>
+  <filename>{filename}</filename>
+  <size>
+    <width>{width}</width>
+    <height>{height}</height>
+    <depth>3</depth>
+  </size>
+{objects}</annotation>
+"""
+VOC_OBJECT = """  <object>
+    <name>{}</name>
+    <pose>Unspecified</pose>
+    <truncated>0</truncated>
+    <difficult>0</difficult>
+    <bndbox>
+      <xmin>{}</xmin>
+      <ymin>{}</ymin>
+      <xmax>{}</xmax>
+      <ymax>{}</ymax>
+    </bndbox>
+  </object>
+"""
+
+
+def export_coco(
+    input_path: Path,
+    output_json: Path,
+    classes: list[str],
+    chunk_size: int = CHUNK_SIZE,
+) -> ConversionReport:
+    """Export PASCAL VOC annotations to a COCO JSON file.
+
+    The object annotations are streamed to the file, only the images and
+    categories are held in memory.
+
+    :param input_path: Directory containing the input XML files, or a zip or
+        tar archive of them.
+    :param output_json: Path to the COCO JSON file.
+    :param classes: A list of class names as strings.
+    :param chunk_size: Number of annotations converted at once.
+    :return: Report of the export.
+    """
+    start = time.perf_counter()
+    report = ConversionReport()
+    class_map = class_id_map(classes)
+    # COCO category ids start at 1, 0 is commonly used for the background.
+    categories = [
+        {"id": class_id + 1, "name": class_name}
+        for class_id, class_name in enumerate(classes)
+    ]
+    images = []
+
+    output_json.parent.mkdir(parents=True, exist_ok=True)
+    with output_json.open("w", encoding="utf-8") as file:
+        file.write(f'{{"categories": {json.dumps(categories)}, ')
+        file.write('"annotations": [')
+        separator = ""
+        for chunk in split_chunks(iter_annotations(input_path), chunk_size):
+            names, annotations = parse_annotations(chunk, class_map, report)
+            for name, annotation in zip(names, annotations):
+                images.append(
+                    {
+                        "id": len(images) + 1,
+                        "file_name": annotation.filename or Path(name).stem,
+                        "width": annotation.width,
+                        "height": annotation.height,
+                    }
+                )
+
+            boxes, _, offsets = stack_boxes(annotations)
+            coco_boxes = voc_to_coco(boxes)
+            areas = (coco_boxes[:, 2] * coco_boxes[:, 3]).tolist()
+            image_ids = np.repeat(
+                np.arange(len(images) - len(annotations), len(images)) + 1,
+                np.diff(offsets),
+            ).tolist()
+            category_ids = [
+                class_id + 1
+                for annotation in annotations
+                for class_id in annotation.class_ids
+            ]
+            for image_id, category_id, box, area in zip(
+                image_ids, category_ids, coco_boxes.tolist(), areas
+            ):
+                report.objects += 1
+                file.write(separator)
+                file.write(
+                    COCO_ANNOTATION.format(
+                        report.objects, image_id, category_id, *box, area
+                    )
+                )
+                separator = ", "
+            report.files += len(annotations)
+
+        file.write(f'], "images": {json.dumps(images)}}}')
+
+    report.seconds = time.perf_counter() - start
+    return report
+
+
+def parse_yolo_labels(content: bytes) -> tuple[np.ndarray, np.ndarray]:
+    """Parse a YOLO label file.
+
+    :param content: Content of the label file.
+    :return: Class ids, and array of shape (N, 4) of YOLO boxes.
+    :raises ValueError: If a line does not hold a class id and a box.
+    """
+    values = np.array(content.split(), dtype=np.float64)
+    if len(values) % 5:
+        raise ValueError("Every line must hold a class id and 4 values.")
+    values = values.reshape(-1, 5)
+    class_ids = values[:, 0].astype(np.int64)
+    if np.any(class_ids != values[:, 0]) or np.any(class_ids < 0):
+        raise ValueError("Class ids must be non-negative integers.")
+    return class_ids, values[:, 1:]
+
+
+def iter_yolo_chunks(
+    input_path: Path, classes: list[str], chunk_size: int = CHUNK_SIZE
+) -> Iterator[tuple[LabelStore, ConversionReport]]:
+    """Read YOLO labels in chunks of images.
+
+    The chunks of a .labels store are views into the store, label files of a
+    directory tree or an archive are parsed into the same arrays. Labels are
+    named by their path relative to the directory or within the archive.
+
+    :param input_path: Directory or zip or tar archive of .txt label files,
+        or a .labels store.
+    :param classes: A list of class names as strings.
+    :param chunk_size: Number of images per chunk.
+    :return: Iterator over the labels of every chunk, and the errors of the
+        label files that could not be parsed.
+    """
+    if input_path.suffix == LABEL_STORE_SUFFIX:
+        store = load_label_store(input_path)
+        for start in range(0, len(store), chunk_size):
+            end = min(start + chunk_size, len(store))
+            offsets_end = end + 1
+            offsets = store.offsets[start:offsets_end]
+            first, last = offsets[0], offsets[-1]
+            chunk = LabelStore(
+                store.names[start:end],
+                classes,
+                offsets - first,
+                store.class_ids[first:last],
+                store.boxes[first:last],
+            )
+            yield chunk, ConversionReport()
+        return
+
+    if input_path.is_dir():
+        files = (
+            (path.relative_to(input_path).as_posix(), path.read_bytes())
+            for path in sorted(input_path.rglob("*.txt"))
+        )
+    else:
+        files = iter_archive_members(input_path, (".txt",))
+
+    for chunk in split_chunks(files, chunk_size):
+        report = ConversionReport()
+        names = []
+        labels = []
+        for name, content in chunk:
+            try:
+                labels.append(parse_yolo_labels(content))
+            except ValueError as e:
+                report.errors.append((Path(name), f"{type(e).__name__}: {e}"))
+                continue
+            names.append(name)
+        counts = [len(class_ids) for class_ids, _ in labels]
+        offsets = np.zeros(len(labels) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        yield LabelStore(
+            names,
+            classes,
+            offsets,
+            np.concatenate([ids for ids, _ in labels] or [np.zeros(0, int)]),
+            np.concatenate(
+                [boxes for _, boxes in labels] or [np.zeros((0, 4))]
+            ),
+        ), report
+
+
+def export_voc(
+    input_path: Path,
+    output_dir: Path,
+    classes: list[str],
+    image_size: tuple[int, int],
+    image_suffix: str = ".jpg",
+    chunk_size: int = CHUNK_SIZE,
+) -> ConversionReport:
+    """Export YOLO labels to PASCAL VOC XML files.
+
+    The XML files keep the relative paths of the label files, so labels of
+    different subdirectories with the same file name do not collide.
+
+    :param input_path: Directory or zip or tar archive of .txt label files,
+        or a .labels store.
+    :param output_dir: Directory to save the XML files.
+    :param classes: A list of class names as strings.
+    :param image_size: Width and height of the images, which YOLO labels do
+        not record.
+    :param image_suffix: File suffix of the images, for the file names in
+        the annotations.
+    :param chunk_size: Number of label files converted at once.
+    :return: Report of the export.
+    """
+    start = time.perf_counter()
+    report = ConversionReport()
+    width, height = image_size
+    class_names = [escape(class_name) for class_name in classes]
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    for chunk, chunk_report in iter_yolo_chunks(
+        input_path, classes, chunk_size
+    ):
+        report.add(chunk_report)
+        boxes = np.rint(yolo_to_voc(chunk.boxes, image_size))
+        boxes = boxes.astype(np.int64).tolist()
+        class_ids = chunk.class_ids.tolist()
+        offsets = chunk.offsets.tolist()
+        for index, name in enumerate(chunk.names):
+            first, last = offsets[index], offsets[index + 1]
+            relative_path = PurePosixPath(name).with_suffix(".xml")
+            try:
+                output_xml = relative_output_path(
+                    output_dir, relative_path.as_posix()
+                )
+                objects = "".join(
+                    VOC_OBJECT.format(class_names[class_id], *box)
+                    for class_id, box in zip(
+                        class_ids[first:last], boxes[first:last]
+                    )
+                )
+            except IndexError:
+                report.errors.append((Path(name), "Unknown class id."))
+                continue
+            except ValueError as e:
+                report.errors.append((Path(name), str(e)))
+                continue
+            output_xml.parent.mkdir(parents=True, exist_ok=True)
+            output_xml.write_text(
+                VOC_ANNOTATION.format(
+                    filename=escape(relative_path.stem + image_suffix),
+                    width=width,
+                    height=height,
+                    objects=objects,
+                ),
+                encoding="utf-8",
+            )
+            report.files += 1
+            report.objects += last - first
+
+    report.seconds = time.perf_counter() - start
+    return report
+
+
+def main(
+    output_format: str,
+    input_path: Path,
+    output_path: Path,
+    classes_file: Path,
+    image_size: Optional[tuple[int, int]] = None,
+    image_suffix: str = ".jpg",
+    chunk_size: int = CHUNK_SIZE,
+) -> None:
+    """Export annotations main function.
+
+    :param output_format: Format to export to, coco or voc.
+    :param input_path: PASCAL VOC annotations for coco, YOLO labels for voc.
+    :param output_path: COCO JSON file, or directory of XML files.
+    :param classes_file: File containing class names, one per line.
+    :param image_size: Width and height of the images, for voc.
+    :param image_suffix: File suffix of the images, for voc.
+    :param chunk_size: Number of files converted at once.
+    """
+    classes = classes_file.read_text().splitlines()
+
+    if output_format == "coco":
+        report = export_coco(input_path, output_path, classes, chunk_size)
+    else:
+        if image_size is None:
+            raise ValueError("The image size is required to export to VOC.")
+        report = export_voc(
+            input_path,
+            output_path,
+            classes,
+            image_size,
+            image_suffix,
+            chunk_size,
+        )
+    print_report(report)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Export annotations to COCO JSON or PASCAL VOC XML"
+    )
+    parser.add_argument(
+        "output_format",
+        choices=["coco", "voc"],
+        help=(
+            "coco: PASCAL VOC annotations to a COCO JSON file, "
+            "voc: YOLO labels to PASCAL VOC XML files"
+        ),
+    )
+    parser.add_argument(
+        "input_path",
+        type=Path,
+        help=(
+            "Directory or .zip or .tar archive of the annotations, or a "
+            ".labels store of YOLO labels"
+        ),
+    )
+    parser.add_argument(
+        "output_path",
+        type=Path,
+        help="COCO JSON file, or directory to save the XML files",
+    )
+    parser.add_argument(
+        "classes_file",
+        type=Path,
+        help="File containing class names, one per line",
+    )
+    parser.add_argument(
+        "--image-size",
+        type=int,
+        nargs=2,
+        metavar=("WIDTH", "HEIGHT"),
+        help="Size of the images, required to export YOLO labels to VOC",
+    )
+    parser.add_argument(
+        "--image-suffix",
+        default=".jpg",
+        help="File suffix of the images, for the VOC file names",
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=CHUNK_SIZE,
+        help="Number of files converted at once",
+    )
+
+    args = parser.parse_args()
+    main(
+        args.output_format,
+        args.input_path,
+        args.output_path,
+        args.classes_file,
+        args.image_size,
+        args.image_suffix,
+        args.chunk_size,
+    )
@@ -1,14 +1,70 @@
 """HTML zip extractor to CSV.
 
-Opens a zip file to extract the names of HTML files contained within.
-It then creates a CSV file with the following format: [File name, Views, Reads]
+Opens a zip file to read the HTML files contained within, without extracting
+it, and parses the title, publishing date and word count of every post. It
+then creates a CSV file with the following format:
+[File name, Title, Published, Words, Views, Reads]
+
+Views and reads are not part of a Medium export and are left as 0.
 """
 
 import argparse
 import csv
-import shutil
-from pathlib import Path
-from zipfile import ZipFile
+import html
+import re
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain
+from pathlib import Path, PurePosixPath
+from typing import Iterable, Iterator, NamedTuple, Optional
+from zipfile import ZipFile, ZipInfo
+
+from parallel_map import split_chunks
+
+POSTS_PER_CHUNK = 64
+TITLE_PATTERN = re.compile(rb"<title[^>]*>(.*?)</title>", re.DOTALL)
+PUBLISHED_PATTERN = re.compile(
+    rb'<time class="dt-published" datetime="(\d{4}-\d{2}-\d{2})'
+)
+# The story of a Medium post starts after its title header.
+STORY_START = b'<section data-field="body"'
+TAG_PATTERN = re.compile(rb"<[^>]*>")
+
+# Zip archive opened by every worker process.
+_worker_zip: Optional[ZipFile] = None
+
+
+class PostMetadata(NamedTuple):
+    """Metadata of an HTML post."""
+
+    file_name: str
+    title: str
+    published: str
+    words: int
+
+
+def _html_members(zip_ref: ZipFile) -> Iterator[ZipInfo]:
+    """HTML file members of a zip archive, from its central directory.
+
+    :param zip_ref: Open zip archive.
+    :return: Iterator over the HTML members.
+    """
+    for info in zip_ref.infolist():
+        if not info.is_dir() and info.filename.endswith(".html"):
+            yield info
+
+
+def iter_html_file_names(zip_file_path: Path) -> Iterator[str]:
+    """Lazily yield the names of the HTML files within the zip archive.
+
+    The names are read from the central directory of the archive, nothing
+    is extracted.
+
+    :param zip_file_path: Path to zip file.
+    :return: Iterator over the HTML file names, without their folders.
+    """
+    with ZipFile(zip_file_path, "r") as zip_ref:
+        for info in _html_members(zip_ref):
+            yield PurePosixPath(info.filename).name
 
 
 def extract_file_names(zip_file_path: Path) -> list[str]:
@@ -17,17 +73,125 @@ def extract_file_names(zip_file_path: Path) -> list[str]:
     :param zip_file_path: Path to zip file.
     :return: List of HTML file names.
     """
-    file_names = []
-    with ZipFile(zip_file_path, "r") as zip_ref:
-        temp_dir = Path(zip_file_path.parent, "temp")
-        zip_ref.extractall(temp_dir)
+    return list(iter_html_file_names(zip_file_path))
+
+
+def _story(content: bytes) -> bytes:
+    """HTML of the story of a Medium post, or the body of other HTML files.
+
+    Searched with ``bytes.find``, which is much faster than a regular
+    expression spanning the whole document.
+
+    :param content: HTML content of the post.
+    :return: HTML of the story, without its title header and footer.
+    """
+    start = content.find(STORY_START)
+    if start < 0:
+        start = content.find(b"<body")
+    if start < 0:
+        return b""
+    start = content.find(b">", start) + 1
+    for end_tag in (b"<footer", b"</body>"):
+        end = content.find(end_tag, start)
+        if end >= 0:
+            return content[start:end]
+    return content[start:]
+
+
+def parse_post(file_name: str, content: bytes) -> PostMetadata:
+    """Parse the metadata of an HTML post.
+
+    The words are counted in the story of a Medium post, or in the whole
+    body of other HTML files.
+
+    :param file_name: File name of the post.
+    :param content: HTML content of the post.
+    :return: Title, publishing date as YYYY-MM-DD, empty for drafts, and
+        number of words of the post.
+    """
+    title = TITLE_PATTERN.search(content)
+    published = PUBLISHED_PATTERN.search(content)
+    text = TAG_PATTERN.sub(b" ", _story(content))
+    return PostMetadata(
+        file_name,
+        (
+            html.unescape(title.group(1).decode("utf-8", "replace")).strip()
+            if title
+            else ""
+        ),
+        published.group(1).decode("ascii") if published else "",
+        len(text.split()),
+    )
 
-        for file_path in temp_dir.rglob("*.html"):
-            file_names.append(file_path.name)
 
-        shutil.rmtree(temp_dir)
+def parse_zip_posts(
+    zip_ref: ZipFile, member_names: list[str]
+) -> list[PostMetadata]:
+    """Read and parse HTML posts from the zip archive.
 
-    return file_names
+    :param zip_ref: Open zip archive.
+    :param member_names: Names of the HTML members to parse.
+    :return: Metadata of the posts.
+    """
+    return [
+        parse_post(PurePosixPath(name).name, zip_ref.read(name))
+        for name in member_names
+    ]
+
+
+def _open_worker_zip(zip_file_path: Path) -> None:
+    """Open the zip archive once per worker process.
+
+    Reading the central directory of a large export takes longer than
+    parsing a chunk of posts, so it is not repeated for every chunk.
+
+    :param zip_file_path: Path to zip file.
+    """
+    global _worker_zip  # pylint: disable=global-statement
+    _worker_zip = ZipFile(zip_file_path, "r")
+
+
+def _parse_worker_posts(member_names: list[str]) -> list[PostMetadata]:
+    """Parse HTML posts from the zip archive of the worker process.
+
+    :param member_names: Names of the HTML members to parse.
+    :return: Metadata of the posts.
+    """
+    return parse_zip_posts(_worker_zip, member_names)
+
+
+def iter_post_metadata(
+    zip_file_path: Path,
+    workers: Optional[int] = 1,
+    chunk_size: int = POSTS_PER_CHUNK,
+) -> Iterator[PostMetadata]:
+    """Lazily parse the HTML posts within the zip archive, in archive order.
+
+    Worker processes read the posts they parse from the archive themselves,
+    so that only member names and metadata are sent between processes.
+
+    :param zip_file_path: Path to zip file.
+    :param workers: Number of worker processes, one per CPU if None, and no
+        pool if 1.
+    :param chunk_size: Number of posts parsed by a worker at once.
+    :return: Iterator over the metadata of the posts.
+    """
+    with ZipFile(zip_file_path, "r") as zip_ref:
+        member_names = [info.filename for info in _html_members(zip_ref)]
+        if workers == 1:
+            for name in member_names:
+                yield from parse_zip_posts(zip_ref, [name])
+            return
+
+    chunks = split_chunks(member_names, chunk_size)
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_open_worker_zip,
+        initargs=(zip_file_path,),
+    ) as executor:
+        yield from chain.from_iterable(
+            executor.map(_parse_worker_posts, chunks)
+        )
 
 
 def create_csv_file(file_names: list[str], csv_file_path: str) -> None:
@@ -43,32 +207,59 @@ def create_csv_file(file_names: list[str], csv_file_path: str) -> None:
             writer.writerow([file_name, "0", "0"])
 
 
-def main(zip_file_path: Path) -> None:
+def write_posts_csv(posts: Iterable[PostMetadata], csv_file_path: Path) -> int:
+    """Write a CSV file row by row as the posts are parsed.
+
+    :param posts: Metadata of the posts.
+    :param csv_file_path: Path to the CSV output file.
+    :return: Number of posts written.
+    """
+    count = 0
+    with open(csv_file_path, "w", newline="", encoding="utf-8") as file:
+        writer = csv.writer(file)
+        writer.writerow(
+            ["File", "Title", "Published", "Words", "Views", "Reads"]
+        )
+        for post in posts:
+            writer.writerow([*post, "0", "0"])
+            count += 1
+    return count
+
+
+def main(zip_file_path: Path, workers: Optional[int] = 1) -> None:
     """Main function for creating the CSV.
 
     :param zip_file_path: Path to the zip file containing HTML files.
+    :param workers: Number of worker processes, one per CPU if None.
     """
     csv_file_name = zip_file_path.stem + ".csv"
     csv_file_path = zip_file_path.parent.joinpath(csv_file_name)
 
-    file_names = extract_file_names(zip_file_path)
-    if file_names:
-        create_csv_file(file_names, csv_file_path)
+    posts = iter_post_metadata(zip_file_path, workers)
+    if write_posts_csv(posts, csv_file_path):
         print(f"CSV file created successfully at {csv_file_path}")
     else:
+        csv_file_path.unlink()
         print("No file names were extracted.")
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(
         description=(
-            "Extract file name from HTML files in a zip archive and save to a "
-            "CSV file."
+            "Extract file name, title, publishing date and word count from "
+            "HTML files in a zip archive and save to a CSV file."
         )
     )
     parser.add_argument(
         "zip_file_path", help="Path to the zip file containing HTML files."
     )
+    parser.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of worker processes, 0 for one per CPU.",
+    )
 
     args = parser.parse_args()
-    main(Path(args.zip_file_path))
+    main(Path(args.zip_file_path), args.workers or None)
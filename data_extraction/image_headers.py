@@ -0,0 +1,79 @@
+"""Image sizes from PNG and JPEG headers.
+
+Reads the width and height of an image from the first bytes of the file,
+without decoding it: the IHDR chunk of a PNG, or the start of frame segment
+of a JPEG, which only requires skipping the segments before it.
+"""
+
+import struct
+from pathlib import Path
+from typing import BinaryIO
+
+IMAGE_SUFFIXES = (".jpg", ".jpeg", ".png")
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+JPEG_SIGNATURE = b"\xff\xd8"
+# Start of frame markers, all but DHT (C4), JPG (C8) and DAC (CC).
+JPEG_FRAME_MARKERS = frozenset(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+# Markers without a segment length: TEM, RSTn, SOI and EOI.
+JPEG_STANDALONE_MARKERS = frozenset([0x01, *range(0xD0, 0xDA)])
+
+
+def _read_exactly(file: BinaryIO, size: int) -> bytes:
+    """Read a number of bytes from a file.
+
+    :param file: Binary file.
+    :param size: Number of bytes.
+    :return: Bytes read.
+    :raises ValueError: If the file ends before.
+    """
+    data = file.read(size)
+    if len(data) != size:
+        raise ValueError("Truncated image header.")
+    return data
+
+
+def _jpeg_size(file: BinaryIO) -> tuple[int, int]:
+    """Size of a JPEG image from its start of frame segment.
+
+    :param file: Binary file positioned after the start of image marker.
+    :return: Width and height of the image.
+    :raises ValueError: If there is no start of frame segment.
+    """
+    while True:
+        if _read_exactly(file, 1) != b"\xff":
+            raise ValueError("Invalid JPEG marker.")
+        marker = _read_exactly(file, 1)[0]
+        # Markers may be preceded by any number of fill bytes.
+        while marker == 0xFF:
+            marker = _read_exactly(file, 1)[0]
+        if marker in JPEG_STANDALONE_MARKERS:
+            continue
+        (length,) = struct.unpack(">H", _read_exactly(file, 2))
+        if marker in JPEG_FRAME_MARKERS:
+            height, width = struct.unpack(">xHH", _read_exactly(file, 5))
+            return width, height
+        if length < 2:
+            raise ValueError("Invalid JPEG segment length.")
+        file.seek(length - 2, 1)
+
+
+def image_size(image_path: Path) -> tuple[int, int]:
+    """Size of a PNG or JPEG image, read from its header.
+
+    :param image_path: Path to the image.
+    :return: Width and height of the image.
+    :raises ValueError: If the file is not a valid PNG or JPEG image.
+    """
+    with open(image_path, "rb") as file:
+        signature = file.read(len(PNG_SIGNATURE))
+        if signature == PNG_SIGNATURE:
+            chunk_length, chunk_type, width, height = struct.unpack(
+                ">I4sII", _read_exactly(file, 16)
+            )
+            if chunk_type != b"IHDR" or chunk_length < 8:
+                raise ValueError("PNG image without IHDR chunk.")
+            return width, height
+        if signature.startswith(JPEG_SIGNATURE):
+            file.seek(len(JPEG_SIGNATURE))
+            return _jpeg_size(file)
+    raise ValueError("Not a PNG or JPEG image.")
@@ -0,0 +1,304 @@
+"""Read annotations from and write labels to zip and tar archives.
+
+Archive members are streamed one at a time, without extracting the archive
+to disk. Labels can be written to a directory, a single archive, a fixed
+number of tar shards or a binary label store, which avoids writing one small
+file per image.
+"""
+
+import io
+import os
+import tarfile
+import time
+import zipfile
+import zlib
+from pathlib import Path, PurePosixPath
+from typing import Iterator, Optional, Protocol, Sequence
+
+from label_store import LABEL_STORE_SUFFIX, LabelStoreWriter
+
+ZIP_SUFFIXES = (".zip",)
+TAR_SUFFIXES = (".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tar.xz")
+TAR_WRITE_MODES = {
+    ".tar": "w",
+    ".tar.gz": "w:gz",
+    ".tgz": "w:gz",
+    ".tar.bz2": "w:bz2",
+    ".tar.xz": "w:xz",
+}
+
+
+def archive_suffix(path: Path) -> Optional[str]:
+    """Archive suffix of a path.
+
+    :param path: Path to a file.
+    :return: Archive suffix, e.g. .zip or .tar.gz, or None if the path is not
+        an archive.
+    """
+    name = path.name.lower()
+    for suffix in ZIP_SUFFIXES + TAR_SUFFIXES:
+        if name.endswith(suffix):
+            return suffix
+    return None
+
+
+def format_labels(
+    class_ids: Sequence[int], boxes: Sequence[Sequence[float]]
+) -> str:
+    """Format labels as the lines of a YOLO label file.
+
+    :param class_ids: Class id of every object.
+    :param boxes: YOLO box of every object.
+    :return: One line per object with its class id and box.
+    """
+    return "".join(
+        f"{class_id} {' '.join(map(str, box))}\n"
+        for class_id, box in zip(class_ids, boxes)
+    )
+
+
+def iter_archive_members(
+    archive_path: Path, suffixes: tuple[str, ...] = (".xml",)
+) -> Iterator[tuple[str, bytes]]:
+    """Stream the content of the archive members with the given suffixes.
+
+    Tar archives, compressed or not, are read sequentially, so that a member
+    is only held in memory while it is processed.
+
+    :param archive_path: Path to a zip or tar archive.
+    :param suffixes: File suffixes of the members to read.
+    :return: Iterator over the member names and contents.
+    """
+    if zipfile.is_zipfile(archive_path):
+        with zipfile.ZipFile(archive_path) as archive:
+            for info in archive.infolist():
+                if not info.is_dir() and info.filename.endswith(suffixes):
+                    yield info.filename, archive.read(info)
+        return
+
+    with tarfile.open(archive_path, "r|*") as archive:
+        for member in archive:
+            if member.isfile() and member.name.endswith(suffixes):
+                yield member.name, archive.extractfile(member).read()
+
+
+def relative_output_path(output_dir: Path, name: str) -> Path:
+    """Path of an output file named by a relative archive member path.
+
+    :param output_dir: Directory to write the output files to.
+    :param name: File path relative to the directory, with / separators.
+    :return: Path of the output file within the directory.
+    :raises ValueError: If the path leads outside the directory.
+    """
+    relative_path = PurePosixPath(name)
+    if relative_path.is_absolute() or ".." in relative_path.parts:
+        raise ValueError(f"Path {name} is outside the output directory.")
+    return output_dir.joinpath(*relative_path.parts)
+
+
+class LabelWriter(Protocol):
+    """Destination of label files."""
+
+    def write(
+        self,
+        name: str,
+        class_ids: Sequence[int],
+        boxes: Sequence[Sequence[float]],
+    ) -> None:
+        """Write the labels of an image."""
+
+    def abort(self) -> None:
+        """Stop writing after an error, discarding what can be discarded."""
+
+    def close(self) -> None:
+        """Finish writing the label files."""
+
+
+class LabelDirectory:
+    """Writes every label file to a directory."""
+
+    def __init__(self, output_dir: Path) -> None:
+        """Initialize the writer.
+
+        :param output_dir: Directory to write the label files to.
+        """
+        self.output_dir = output_dir
+        output_dir.mkdir(parents=True, exist_ok=True)
+
+    def write(
+        self,
+        name: str,
+        class_ids: Sequence[int],
+        boxes: Sequence[Sequence[float]],
+    ) -> None:
+        """Write a label file.
+
+        :param name: File path of the labels, relative to the directory.
+        :param class_ids: Class id of every object.
+        :param boxes: YOLO box of every object.
+        :raises ValueError: If the path leads outside the directory.
+        """
+        output_txt = relative_output_path(self.output_dir, name)
+        output_txt.parent.mkdir(parents=True, exist_ok=True)
+        output_txt.write_text(
+            format_labels(class_ids, boxes), encoding="utf-8"
+        )
+
+    def abort(self) -> None:
+        """Stop writing, the label files written so far are kept."""
+
+    def close(self) -> None:
+        """Finish writing the label files."""
+
+
+class LabelArchive:
+    """Writes label files into a zip or tar archive.
+
+    The archive is written to a temporary file next to it, which only
+    replaces the archive once it is complete.
+    """
+
+    def __init__(self, archive_path: Path) -> None:
+        """Initialize the writer.
+
+        :param archive_path: Path to the archive, its suffix selects the
+            format and compression.
+        """
+        suffix = archive_suffix(archive_path)
+        if suffix is None:
+            raise ValueError(f"Unknown archive format: {archive_path}")
+        archive_path.parent.mkdir(parents=True, exist_ok=True)
+        self.archive_path = archive_path
+        self.temp_path = archive_path.with_name(archive_path.name + ".tmp")
+        self.zip_archive = None
+        self.tar_archive = None
+        if suffix in ZIP_SUFFIXES:
+            self.zip_archive = zipfile.ZipFile(
+                self.temp_path, "w", zipfile.ZIP_DEFLATED
+            )
+        else:
+            self.tar_archive = tarfile.open(
+                self.temp_path, TAR_WRITE_MODES[suffix]
+            )
+        self.mtime = time.time()
+
+    def write(
+        self,
+        name: str,
+        class_ids: Sequence[int],
+        boxes: Sequence[Sequence[float]],
+    ) -> None:
+        """Write a label file into the archive.
+
+        :param name: File name of the labels.
+        :param class_ids: Class id of every object.
+        :param boxes: YOLO box of every object.
+        """
+        data = format_labels(class_ids, boxes).encode("utf-8")
+        if self.zip_archive is not None:
+            self.zip_archive.writestr(name, data)
+            return
+        info = tarfile.TarInfo(name)
+        info.size = len(data)
+        info.mtime = self.mtime
+        self.tar_archive.addfile(info, io.BytesIO(data))
+
+    def _close_archive(self) -> None:
+        """Close the temporary archive."""
+        if self.zip_archive is not None:
+            self.zip_archive.close()
+        else:
+            self.tar_archive.close()
+
+    def abort(self) -> None:
+        """Stop writing, leaving a previous archive unchanged."""
+        self._close_archive()
+        self.temp_path.unlink(missing_ok=True)
+
+    def close(self) -> None:
+        """Finish writing the archive and replace the previous one."""
+        self._close_archive()
+        os.replace(self.temp_path, self.archive_path)
+
+
+class ShardedLabelArchive:
+    """Writes label files into a fixed number of tar shards."""
+
+    def __init__(self, output_dir: Path, shards: int) -> None:
+        """Initialize the writer.
+
+        :param output_dir: Directory to write the shards to.
+        :param shards: Number of shards.
+        """
+        if shards < 1:
+            raise ValueError("The number of shards must be at least 1.")
+        self.shards = [
+            LabelArchive(
+                output_dir / f"labels-{index:05d}-of-{shards:05d}.tar"
+            )
+            for index in range(shards)
+        ]
+
+    def write(
+        self,
+        name: str,
+        class_ids: Sequence[int],
+        boxes: Sequence[Sequence[float]],
+    ) -> None:
+        """Write a label file into the shard selected by its name.
+
+        :param name: File name of the labels.
+        :param class_ids: Class id of every object.
+        :param boxes: YOLO box of every object.
+        """
+        shard = zlib.crc32(name.encode("utf-8")) % len(self.shards)
+        self.shards[shard].write(name, class_ids, boxes)
+
+    def abort(self) -> None:
+        """Stop writing all shards."""
+        for shard in self.shards:
+            shard.abort()
+
+    def close(self) -> None:
+        """Finish writing all shards and replace the previous ones."""
+        for shard in self.shards:
+            shard.close()
+
+
+def is_label_directory(
+    output_path: Path, shards: Optional[int] = None
+) -> bool:
+    """Whether labels are written as one file per image to a directory.
+
+    :param output_path: Directory, archive or label store to write to.
+    :param shards: Number of tar shards to write into the directory.
+    :return: True if the output is a plain directory of label files.
+    """
+    return (
+        not shards
+        and archive_suffix(output_path) is None
+        and output_path.suffix != LABEL_STORE_SUFFIX
+    )
+
+
+def open_label_writer(
+    output_path: Path,
+    classes: Sequence[str],
+    shards: Optional[int] = None,
+) -> LabelWriter:
+    """Open the destination of the label files.
+
+    :param output_path: Directory, archive or label store to write the labels
+        to, a label store is selected by the .labels suffix.
+    :param classes: A list of class names as strings.
+    :param shards: Number of tar shards to write into the directory, one file
+        per label if not given.
+    :return: Label writer.
+    """
+    if output_path.suffix == LABEL_STORE_SUFFIX:
+        return LabelStoreWriter(output_path, classes)
+    if shards:
+        return ShardedLabelArchive(output_path, shards)
+    if archive_suffix(output_path) is not None:
+        return LabelArchive(output_path)
+    return LabelDirectory(output_path)
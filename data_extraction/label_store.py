@@ -0,0 +1,208 @@
+"""Consolidated binary store of YOLO labels.
+
+Holds the labels of a whole dataset in a single file: a contiguous float32
+array of boxes, an int16 array of class ids and an offset index with the
+first object of every image. The arrays are memory-mapped, or loaded with a
+single read, and the labels of an image are zero-copy slices of them.
+
+File layout: an 8-byte magic, the little-endian length of a JSON header with
+the image names, class names and array layout, and the arrays themselves,
+each aligned to 64 bytes, at offsets relative to the end of the header.
+"""
+
+import json
+import os
+import struct
+from array import array
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Sequence
+
+import numpy as np
+
+LABEL_STORE_SUFFIX = ".labels"
+MAGIC = b"YOLOLBL\x01"
+HEADER_LENGTH = struct.Struct("<Q")
+ALIGNMENT = 64
+DTYPES = {"offsets": "<i8", "class_ids": "<i2", "boxes": "<f4"}
+
+
+@dataclass
+class LabelStore:
+    """YOLO labels of a dataset as contiguous arrays.
+
+    The objects of image ``i`` are ``offsets[i]`` to ``offsets[i + 1]``,
+    with boxes as normalised (x_center, y_center, width, height).
+    """
+
+    names: list[str]
+    classes: list[str]
+    offsets: np.ndarray
+    class_ids: np.ndarray
+    boxes: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def labels(self, index: int) -> tuple[np.ndarray, np.ndarray]:
+        """Labels of an image, as views into the store.
+
+        :param index: Index of the image.
+        :return: Class ids and boxes of the objects of the image.
+        """
+        start, end = self.offsets[index], self.offsets[index + 1]
+        return self.class_ids[start:end], self.boxes[start:end]
+
+
+def _aligned(offset: int) -> int:
+    """Round an offset up to the array alignment.
+
+    :param offset: Offset in bytes.
+    :return: Aligned offset.
+    """
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def temp_store_path(store_path: Path) -> Path:
+    """Path a store is written to before it replaces the store.
+
+    :param store_path: Path to the store file.
+    :return: Path to the temporary file.
+    """
+    return store_path.with_suffix(".tmp")
+
+
+def save_label_store(store_path: Path, store: LabelStore) -> None:
+    """Write a label store atomically.
+
+    :param store_path: Path to the store file.
+    :param store: Labels to write.
+    """
+    arrays = {
+        name: np.ascontiguousarray(getattr(store, name), dtype=dtype)
+        for name, dtype in DTYPES.items()
+    }
+    layout = {
+        name: {"shape": list(values.shape), "dtype": values.dtype.str}
+        for name, values in arrays.items()
+    }
+    offset = 0
+    for name, values in arrays.items():
+        layout[name]["offset"] = offset
+        offset = _aligned(offset + values.nbytes)
+    header = {
+        "names": store.names,
+        "classes": store.classes,
+        "arrays": layout,
+    }
+    header_bytes = json.dumps(header).encode("utf-8")
+    data_start = _aligned(len(MAGIC) + HEADER_LENGTH.size + len(header_bytes))
+
+    temp_path = temp_store_path(store_path)
+    with open(temp_path, "wb") as file:
+        file.write(MAGIC)
+        file.write(HEADER_LENGTH.pack(len(header_bytes)))
+        file.write(header_bytes)
+        for name, values in arrays.items():
+            file.seek(data_start + layout[name]["offset"])
+            file.write(values.tobytes())
+        # Empty trailing arrays write nothing, so the file is extended to
+        # the end of the last array for their offsets to stay in bounds.
+        file.truncate(data_start + offset)
+    os.replace(temp_path, store_path)
+
+
+def load_label_store(store_path: Path, mmap: bool = True) -> LabelStore:
+    """Load a label store.
+
+    :param store_path: Path to the store file.
+    :param mmap: Memory-map the arrays, rather than reading the whole file
+        at once.
+    :return: Labels of the dataset.
+    :raises ValueError: If the file is not a label store, or is truncated.
+    """
+    if mmap:
+        data = np.memmap(store_path, dtype=np.uint8, mode="r")
+    else:
+        data = np.frombuffer(Path(store_path).read_bytes(), dtype=np.uint8)
+
+    magic_end = len(MAGIC)
+    header_start = magic_end + HEADER_LENGTH.size
+    if bytes(data[:magic_end]) != MAGIC:
+        raise ValueError(f"{store_path} is not a label store.")
+    (header_length,) = HEADER_LENGTH.unpack(
+        bytes(data[magic_end:header_start])
+    )
+    header_end = header_start + header_length
+    header = json.loads(bytes(data[header_start:header_end]))
+    data_start = _aligned(header_end)
+
+    arrays = {}
+    for name, layout in header["arrays"].items():
+        dtype = np.dtype(layout["dtype"])
+        count = int(np.prod(layout["shape"]))
+        offset = data_start + layout["offset"]
+        if offset + count * dtype.itemsize > len(data):
+            raise ValueError(f"{store_path} is truncated.")
+        arrays[name] = np.frombuffer(data, dtype, count, offset).reshape(
+            layout["shape"]
+        )
+
+    return LabelStore(header["names"], header["classes"], **arrays)
+
+
+class LabelStoreWriter:
+    """Collects labels into compact arrays and writes them as a store."""
+
+    def __init__(self, store_path: Path, classes: Sequence[str]) -> None:
+        """Initialize the writer.
+
+        :param store_path: Path to the store file.
+        :param classes: A list of class names as strings.
+        """
+        self.store_path = store_path
+        self.classes = list(classes)
+        self.names = []
+        self.offsets = array("q", [0])
+        self.class_ids = array("h")
+        self.boxes = array("f")
+
+    def write(
+        self,
+        name: str,
+        class_ids: Sequence[int],
+        boxes: Sequence[Sequence[float]],
+    ) -> None:
+        """Add the labels of an image.
+
+        :param name: File name of the labels.
+        :param class_ids: Class id of every object.
+        :param boxes: YOLO box of every object.
+        """
+        self.names.append(name)
+        self.class_ids.extend(class_ids)
+        for box in boxes:
+            self.boxes.extend(box)
+        self.offsets.append(len(self.class_ids))
+
+    def abort(self) -> None:
+        """Discard the labels, leaving a previous store unchanged."""
+        self.names = []
+        self.offsets = array("q", [0])
+        self.class_ids = array("h")
+        self.boxes = array("f")
+        temp_store_path(self.store_path).unlink(missing_ok=True)
+
+    def close(self) -> None:
+        """Write the store."""
+        self.store_path.parent.mkdir(parents=True, exist_ok=True)
+        save_label_store(
+            self.store_path,
+            LabelStore(
+                self.names,
+                self.classes,
+                np.frombuffer(self.offsets, dtype=np.int64),
+                np.frombuffer(self.class_ids, dtype=np.int16),
+                np.frombuffer(self.boxes, dtype=np.float32).reshape(-1, 4),
+            ),
+        )
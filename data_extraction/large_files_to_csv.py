@@ -1,16 +1,25 @@
 """Large files to CSV.
 
 Sorts large files by date into a CSV from a directory.
+
+Directories are read with ``os.scandir``, whose entries cache the file type,
+so only files whose name matches a pattern are stat'ed for their size. In
+recursive mode, subdirectories are scanned in parallel by a thread pool.
 """
 
 import argparse
 import csv
+import os
 import re
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from datetime import datetime
-from pathlib import Path
+from pathlib import Path, PurePath
+from typing import Optional, Sequence
 
 from html_zip_extractor_to_csv import create_csv_file
 
+DATE_PREFIX_PATTERN = r"^\d{4}-\d{2}-\d{2}_"
+
 
 def parse_date(file_name: str) -> datetime:
     """Parse the date from the beginning of a file name, assuming it's in
@@ -29,8 +38,19 @@ def is_date_prefixed(file_name: str) -> bool:
     :param file_name: The name of the file to check.
     :return: `True` if the file name starts with a date, otherwise `False`.
     """
-    date_pattern = r"^\d{4}-\d{2}-\d{2}_"
-    return bool(re.match(date_pattern, file_name))
+    return bool(re.match(DATE_PREFIX_PATTERN, file_name))
+
+
+def _entry_date(entry: list[str]) -> datetime:
+    """Sort key of a CSV entry, the date prefix of its file name.
+
+    :param entry: CSV row whose first column is a file path.
+    :return: Date of the file, the earliest date if it has none.
+    """
+    file_name = PurePath(entry[0]).name
+    return (
+        parse_date(file_name) if is_date_prefixed(file_name) else datetime.min
+    )
 
 
 def sort_csv_entries(csv_file_path: Path) -> None:
@@ -43,9 +63,7 @@ def sort_csv_entries(csv_file_path: Path) -> None:
         header = next(reader)
         entries = list(reader)
 
-    sorted_entries = sorted(
-        entries, key=lambda x: parse_date(x[0]), reverse=True
-    )
+    sorted_entries = sorted(entries, key=_entry_date, reverse=True)
 
     with open(csv_file_path, mode="w", newline="", encoding="utf-8") as file:
         writer = csv.writer(file)
@@ -53,6 +71,98 @@ def sort_csv_entries(csv_file_path: Path) -> None:
         writer.writerows(sorted_entries)
 
 
+def scan_directory(
+    directory: str, size_threshold_bytes: int, patterns: Sequence[re.Pattern]
+) -> tuple[list[str], list[str]]:
+    """Scan a directory for large files with a matching name.
+
+    The type of an entry is known from the directory listing, and names are
+    matched before the size, so only matching files are stat'ed.
+
+    :param directory: Path to the directory to scan.
+    :param size_threshold_bytes: Size threshold in bytes.
+    :param patterns: Regular expressions searched in the file names.
+    :return: Paths of the large files and of the subdirectories.
+    """
+    large_files = []
+    subdirectories = []
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirectories.append(entry.path)
+                elif (
+                    any(pattern.search(entry.name) for pattern in patterns)
+                    and entry.is_file()
+                    and entry.stat().st_size > size_threshold_bytes
+                ):
+                    large_files.append(entry.path)
+    except OSError as e:
+        print(f"Skipping {directory}: {e.strerror}")
+    return large_files, subdirectories
+
+
+def scan_large_files(
+    directory_path: Path,
+    size_threshold_kb: int = 5,
+    patterns: Sequence[str] = (DATE_PREFIX_PATTERN,),
+    recursive: bool = False,
+    workers: Optional[int] = None,
+) -> list[str]:
+    """Lists files in a directory, or a directory tree, that exceed the
+    specified size threshold and whose name matches one of the patterns.
+
+    In recursive mode, every directory is scanned by a task of a thread pool,
+    which submits the scans of its subdirectories, so that the latency of
+    listing directories on a network share overlaps.
+
+    :param directory_path: Path to the directory to search.
+    :param size_threshold_kb: Size threshold in kilobytes.
+    :param patterns: Regular expressions searched in the file names.
+    :param recursive: Search the subdirectories too.
+    :param workers: Number of threads, the default of ``ThreadPoolExecutor``
+        if None.
+    :return: Paths of the large files, relative to the directory.
+    """
+    size_threshold_bytes = size_threshold_kb * 1024
+    compiled_patterns = [re.compile(pattern) for pattern in patterns]
+
+    if not recursive:
+        large_files, _ = scan_directory(
+            str(directory_path), size_threshold_bytes, compiled_patterns
+        )
+    else:
+        large_files = []
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            pending = {
+                executor.submit(
+                    scan_directory,
+                    str(directory_path),
+                    size_threshold_bytes,
+                    compiled_patterns,
+                )
+            }
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    files, subdirectories = future.result()
+                    large_files.extend(files)
+                    pending.update(
+                        executor.submit(
+                            scan_directory,
+                            subdirectory,
+                            size_threshold_bytes,
+                            compiled_patterns,
+                        )
+                        for subdirectory in subdirectories
+                    )
+
+    return sorted(
+        Path(file_path).relative_to(directory_path).as_posix()
+        for file_path in large_files
+    )
+
+
 def list_large_files(
     directory_path: Path, size_threshold_kb: int = 5
 ) -> list[str]:
@@ -63,30 +173,31 @@ def list_large_files(
     :param size_threshold_kb: Size threshold in kilobytes.
     :return: A list of file names that are larger than the specified size.
     """
-    size_threshold_bytes = size_threshold_kb * 1024
-
-    large_files = []
-    for file_path in directory_path.iterdir():
-        if (
-            file_path.is_file()
-            and file_path.stat().st_size > size_threshold_bytes
-            and is_date_prefixed(file_path.name)
-        ):
-            large_files.append(file_path.name)
+    return scan_large_files(directory_path, size_threshold_kb)
 
-    return large_files
 
-
-def main(directory_path: Path) -> None:
+def main(
+    directory_path: Path,
+    size_threshold_kb: int = 5,
+    patterns: Sequence[str] = (DATE_PREFIX_PATTERN,),
+    recursive: bool = False,
+    workers: Optional[int] = None,
+) -> None:
     """Main function to list large files in a directory, write them to a CSV,
     and sort this CSV by date.
 
     :param directory_path: Path to the directory.
+    :param size_threshold_kb: Size threshold in kilobytes.
+    :param patterns: Regular expressions searched in the file names.
+    :param recursive: Search the subdirectories too.
+    :param workers: Number of threads scanning subdirectories.
     """
     csv_file_name = directory_path.name + "_large_files.csv"
     csv_file_path = directory_path.parent.joinpath(csv_file_name)
 
-    large_file_names = list_large_files(directory_path)
+    large_file_names = scan_large_files(
+        directory_path, size_threshold_kb, patterns, recursive, workers
+    )
     create_csv_file(large_file_names, csv_file_path)
     print(f"CSV file created successfully at {csv_file_path}")
 
@@ -105,6 +216,41 @@ if __name__ == "__main__":
         type=str,
         help="Path to the directory to search for large files.",
     )
+    parser.add_argument(
+        "-s",
+        "--size-threshold",
+        type=int,
+        default=5,
+        help="Size threshold in kilobytes.",
+    )
+    parser.add_argument(
+        "-p",
+        "--pattern",
+        action="append",
+        dest="patterns",
+        help=(
+            "Regular expression searched in the file names, can be repeated. "
+            "Defaults to a YYYY-MM-DD_ date prefix."
+        ),
+    )
+    parser.add_argument(
+        "-r",
+        "--recursive",
+        action="store_true",
+        help="Search the subdirectories too, in parallel.",
+    )
+    parser.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        help="Number of threads scanning subdirectories.",
+    )
 
     args = parser.parse_args()
-    main(Path(args.directory_path))
+    main(
+        Path(args.directory_path),
+        args.size_threshold,
+        args.patterns or [DATE_PREFIX_PATTERN],
+        args.recursive,
+        args.workers,
+    )
@@ -0,0 +1,46 @@
+"""Chunked and bounded mapping of work onto worker processes.
+
+Small files are sent to the workers in chunks, so that the cost of sending
+work to a process is shared by many of them, and the chunks are submitted
+with a bounded number in flight, so that a stream is never read into memory
+all at once.
+"""
+
+from collections import deque
+from concurrent.futures import Executor
+from itertools import islice
+from typing import Callable, Iterable, Iterator
+
+
+def split_chunks(items: Iterable, chunk_size: int) -> Iterator[list]:
+    """Lazily split items into consecutive chunks.
+
+    :param items: Items to split.
+    :param chunk_size: Maximum number of items per chunk.
+    :return: Iterator over the chunks.
+    """
+    iterator = iter(items)
+    return iter(lambda: list(islice(iterator, chunk_size)), [])
+
+
+def map_bounded(
+    executor: Executor, function: Callable, items: Iterable, window: int
+) -> Iterator:
+    """Map a function over items with a bounded number of calls in flight.
+
+    Unlike ``Executor.map``, the items are only consumed as results are
+    taken, so an archive is not read into memory all at once.
+
+    :param executor: Executor to submit the calls to.
+    :param function: Function to apply to every item.
+    :param items: Items to apply the function to.
+    :param window: Maximum number of submitted calls without a taken result.
+    :return: Iterator over the results, in order.
+    """
+    pending = deque()
+    for item in items:
+        pending.append(executor.submit(function, item))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
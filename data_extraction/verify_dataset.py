@@ -0,0 +1,368 @@
+"""Verify PASCAL VOC annotations and YOLO labels against their images.
+
+Only the headers of the images are read, to check that they are valid PNG
+or JPEG files and to cross-check the size recorded in every VOC annotation.
+Boxes outside their image are flagged, as are images without annotations
+or labels and annotations or labels without an image. Images, annotations
+and labels are matched by file name stem, and checked in chunks by worker
+processes. The issues are printed and can be written to a JSON report.
+"""
+
+import argparse
+import json
+import time
+import xml.etree.ElementTree as ET
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import NamedTuple, Optional
+
+import numpy as np
+from bbox_formats import VOC_COORDINATES, yolo_to_voc
+from convert_voc_to_yolo import CHUNK_SIZE, MAX_REPORTED_ERRORS
+from export_annotations import parse_yolo_labels
+from image_headers import IMAGE_SUFFIXES, image_size
+from parallel_map import split_chunks
+
+# Edges of YOLO boxes are computed as center -/+ half the size, which may
+# exceed the image by a rounding error for a box touching its border. The
+# tolerance also covers labels written by other tools with 6 decimals, whose
+# edges are off by at most 7.5e-7.
+BOUNDS_TOLERANCE = 1e-6
+
+
+class Issue(NamedTuple):
+    """Problem found in a file of the dataset."""
+
+    file: str
+    kind: str
+    detail: str = ""
+
+
+@dataclass
+class VerificationReport:
+    """Summary of a dataset verification."""
+
+    images: int = 0
+    annotations: int = 0
+    labels: int = 0
+    seconds: float = 0.0
+    issues: list[Issue] = field(default_factory=list)
+
+    def counts(self) -> dict[str, int]:
+        """Number of issues of every kind."""
+        return dict(
+            sorted(Counter(issue.kind for issue in self.issues).items())
+        )
+
+    def to_dict(self) -> dict:
+        """Report as JSON serializable data."""
+        return {
+            "images": self.images,
+            "annotations": self.annotations,
+            "labels": self.labels,
+            "seconds": self.seconds,
+            "counts": self.counts(),
+            "issues": [issue._asdict() for issue in self.issues],
+        }
+
+
+# Stem, and image, VOC annotation and YOLO labels paths of an image.
+Sample = tuple[str, Optional[Path], Optional[Path], Optional[Path]]
+
+
+def box_issues(
+    file_name: str,
+    boxes: np.ndarray,
+    size: tuple[float, float],
+    tolerance: float = 0.0,
+) -> list[Issue]:
+    """Find the boxes that are empty or not inside their image.
+
+    :param file_name: Name of the annotation or label file.
+    :param boxes: Array of shape (N, 4) of VOC boxes.
+    :param size: Width and height of the image.
+    :param tolerance: Distance by which a box may exceed the image.
+    :return: An issue per invalid box.
+    """
+    mins, maxs = boxes[:, :2], boxes[:, 2:]
+    empty = np.any(maxs <= mins, axis=1)
+    outside = np.any(mins < -tolerance, axis=1) | np.any(
+        maxs > np.asarray(size) + tolerance, axis=1
+    )
+    width, height = size
+    issues = []
+    for index in np.flatnonzero(empty | outside):
+        kind = "empty_box" if empty[index] else "box_out_of_bounds"
+        box = ", ".join(f"{value:g}" for value in boxes[index])
+        detail = f"object {index}: ({box}) in {width:g}x{height:g}"
+        issues.append(Issue(file_name, kind, detail))
+    return issues
+
+
+def check_annotation(
+    annotation_path: Path, size: Optional[tuple[int, int]]
+) -> list[Issue]:
+    """Check a VOC annotation against the size of its image.
+
+    :param annotation_path: Path to the XML annotation.
+    :param size: Width and height read from the image header, None if the
+        image is missing or unreadable.
+    :return: Issues of the annotation.
+    """
+    name = annotation_path.name
+    try:
+        root = ET.parse(annotation_path).getroot()
+        size_element = root.find("size")
+        annotation_size = (
+            int(size_element.find("width").text),
+            int(size_element.find("height").text),
+        )
+        boxes = np.array(
+            [
+                [
+                    float(obj.find(f"bndbox/{coordinate}").text)
+                    for coordinate in VOC_COORDINATES
+                ]
+                for obj in root.iter("object")
+            ],
+            dtype=np.float64,
+        ).reshape(-1, 4)
+    # A malformed annotation is reported and skipped, whatever the error.
+    except Exception as e:  # pylint: disable=broad-exception-caught
+        return [Issue(name, "invalid_annotation", f"{type(e).__name__}: {e}")]
+
+    issues = []
+    if size is not None and annotation_size != size:
+        issues.append(
+            Issue(
+                name,
+                "size_mismatch",
+                f"annotation {annotation_size[0]}x{annotation_size[1]}, "
+                f"image {size[0]}x{size[1]}",
+            )
+        )
+    issues.extend(box_issues(name, boxes, size or annotation_size))
+    return issues
+
+
+def check_labels(labels_path: Path) -> list[Issue]:
+    """Check that the boxes of a YOLO label file are inside the image.
+
+    :param labels_path: Path to the .txt label file.
+    :return: Issues of the label file.
+    """
+    name = labels_path.name
+    try:
+        _, boxes = parse_yolo_labels(labels_path.read_bytes())
+    except ValueError as e:
+        return [Issue(name, "invalid_labels", f"{type(e).__name__}: {e}")]
+    return box_issues(
+        name, yolo_to_voc(boxes, (1, 1)), (1, 1), BOUNDS_TOLERANCE
+    )
+
+
+def check_samples(samples: list[Sample]) -> list[Issue]:
+    """Check the images, annotations and labels of a chunk of samples.
+
+    :param samples: Images and their annotations and labels.
+    :return: Issues found.
+    """
+    issues = []
+    for _, image_path, annotation_path, labels_path in samples:
+        size = None
+        if image_path is not None:
+            try:
+                size = image_size(image_path)
+            except (OSError, ValueError) as e:
+                issues.append(Issue(image_path.name, "corrupt_image", str(e)))
+        if annotation_path is not None:
+            issues.extend(check_annotation(annotation_path, size))
+        if labels_path is not None:
+            issues.extend(check_labels(labels_path))
+    return issues
+
+
+def files_by_stem(
+    directory: Optional[Path],
+    suffixes: tuple[str, ...],
+    issues: list[Issue],
+) -> dict[str, Path]:
+    """Files of a directory with the given suffixes, by file name stem.
+
+    :param directory: Directory to list, or None for no files.
+    :param suffixes: Lowercase file suffixes to select.
+    :param issues: Issues to add files that share a stem to.
+    :return: File path per stem.
+    """
+    if directory is None:
+        return {}
+    files = {}
+    for path in sorted(directory.iterdir()):
+        if not path.is_file() or path.suffix.lower() not in suffixes:
+            continue
+        if path.stem in files:
+            issues.append(
+                Issue(path.name, "duplicate_stem", files[path.stem].name)
+            )
+            continue
+        files[path.stem] = path
+    return files
+
+
+def verify_dataset(
+    images_dir: Path,
+    annotations_dir: Optional[Path] = None,
+    labels_dir: Optional[Path] = None,
+    workers: Optional[int] = None,
+    chunk_size: int = CHUNK_SIZE,
+) -> VerificationReport:
+    """Verify the annotations and labels of a dataset against its images.
+
+    :param images_dir: Directory containing the PNG and JPEG images.
+    :param annotations_dir: Directory containing the VOC XML annotations.
+    :param labels_dir: Directory containing the YOLO .txt labels.
+    :param workers: Number of worker processes, one per CPU if not given,
+        and no pool if 1.
+    :param chunk_size: Number of images sent to a worker at once.
+    :return: Report of the verification.
+    """
+    start = time.perf_counter()
+    report = VerificationReport()
+    images = files_by_stem(images_dir, IMAGE_SUFFIXES, report.issues)
+    annotations = files_by_stem(annotations_dir, (".xml",), report.issues)
+    labels = files_by_stem(labels_dir, (".txt",), report.issues)
+    report.images = len(images)
+    report.annotations = len(annotations)
+    report.labels = len(labels)
+
+    for stem, image_path in images.items():
+        if (annotations_dir is not None and stem not in annotations) or (
+            labels_dir is not None and stem not in labels
+        ):
+            report.issues.append(Issue(image_path.name, "orphan_image"))
+    for path in [*annotations.values(), *labels.values()]:
+        if path.stem not in images:
+            report.issues.append(Issue(path.name, "missing_image"))
+
+    samples = [
+        (stem, images.get(stem), annotations.get(stem), labels.get(stem))
+        for stem in sorted(images.keys() | annotations.keys() | labels.keys())
+    ]
+    if workers == 1:
+        report.issues.extend(check_samples(samples))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(check_samples, chunk)
+                for chunk in split_chunks(samples, chunk_size)
+            ]
+            for future in as_completed(futures):
+                report.issues.extend(future.result())
+
+    report.issues.sort()
+    report.seconds = time.perf_counter() - start
+    return report
+
+
+def print_report(report: VerificationReport) -> None:
+    """Print the summary of a verification.
+
+    :param report: Report of the verification.
+    """
+    print(
+        f"Verified {report.images} images, {report.annotations} annotations "
+        f"and {report.labels} label files in {report.seconds:.2f} s."
+    )
+    if not report.issues:
+        print("No issues found.")
+        return
+    print(f"{len(report.issues)} issues found:")
+    for kind, count in report.counts().items():
+        print(f"  {kind}: {count}")
+    for issue in report.issues[:MAX_REPORTED_ERRORS]:
+        print(f"  {issue.file}: {issue.kind} {issue.detail}".rstrip())
+    if len(report.issues) > MAX_REPORTED_ERRORS:
+        print(f"  ... and {len(report.issues) - MAX_REPORTED_ERRORS} more")
+
+
+def main(
+    images_dir: Path,
+    annotations_dir: Optional[Path] = None,
+    labels_dir: Optional[Path] = None,
+    report_file: Optional[Path] = None,
+    workers: Optional[int] = 1,
+    chunk_size: int = CHUNK_SIZE,
+) -> bool:
+    """Verify dataset main function.
+
+    :param images_dir: Directory containing the PNG and JPEG images.
+    :param annotations_dir: Directory containing the VOC XML annotations.
+    :param labels_dir: Directory containing the YOLO .txt labels.
+    :param report_file: JSON file to write the report to.
+    :param workers: Number of worker processes, one per CPU if None.
+    :param chunk_size: Number of images sent to a worker at once.
+    :return: True if no issues were found.
+    """
+    report = verify_dataset(
+        images_dir, annotations_dir, labels_dir, workers, chunk_size
+    )
+    print_report(report)
+    if report_file is not None:
+        report_file.write_text(
+            json.dumps(report.to_dict(), indent=2), encoding="utf-8"
+        )
+    return not report.issues
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Verify VOC annotations and YOLO labels against images"
+    )
+    parser.add_argument(
+        "images_dir",
+        type=Path,
+        help="Directory containing the PNG and JPEG images",
+    )
+    parser.add_argument(
+        "--annotations",
+        type=Path,
+        help="Directory containing the VOC XML annotations",
+    )
+    parser.add_argument(
+        "--labels",
+        type=Path,
+        help="Directory containing the YOLO .txt labels",
+    )
+    parser.add_argument(
+        "--report",
+        type=Path,
+        help="JSON file to write the report to",
+    )
+    parser.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of worker processes, 0 for one per CPU",
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=CHUNK_SIZE,
+        help="Number of images sent to a worker at once",
+    )
+
+    args = parser.parse_args()
+    if args.annotations is None and args.labels is None:
+        parser.error("at least one of --annotations and --labels is required")
+    passed = main(
+        args.images_dir,
+        args.annotations,
+        args.labels,
+        args.report,
+        args.workers or None,
+        args.chunk_size,
+    )
+    raise SystemExit(0 if passed else 1)
@@ -0,0 +1,61 @@
+"""Weekday and time of day activity matrix.
+
+Sums the steps of the raw records by weekday and time of day, keeping the
+time of day that the daily series discards. Every record is counted in the
+time slot in which it starts, which records of a few minutes make accurate
+at hour and quarter-hour resolution.
+"""
+
+import numpy as np
+from health_export import QuantityRecords
+from timestamps import SECONDS_PER_DAY
+
+SLOTS_PER_DAY = (24, 96)
+BLOCK_SIZE = 1 << 22
+# The Unix epoch, day zero, is a Thursday.
+EPOCH_WEEKDAY = 3
+
+
+def activity_matrix(
+    records: QuantityRecords, slots_per_day: int = 24
+) -> np.ndarray:
+    """Average steps per weekday and time of day.
+
+    Records are aggregated with a single ``bincount`` per block of records,
+    so memory stays bounded for tens of millions of records.
+
+    :param records: Columnar step records.
+    :param slots_per_day: Number of time slots per day, 24 for hours or 96
+        for quarter-hours.
+    :return: Array of shape (7, slots_per_day), from Monday to Sunday, with
+        the average steps per recorded day, NaN for weekdays without records.
+    """
+    if slots_per_day not in SLOTS_PER_DAY:
+        raise ValueError(
+            f"Invalid number of slots per day. Use one of {SLOTS_PER_DAY}."
+        )
+    slot_seconds = SECONDS_PER_DAY // slots_per_day
+
+    totals = np.zeros(7 * slots_per_day)
+    days = []
+    for start in range(0, len(records), BLOCK_SIZE):
+        block = slice(start, start + BLOCK_SIZE)
+        local = records.start[block] + records.utc_offset[block]
+        day = local // SECONDS_PER_DAY
+        weekday = (day + EPOCH_WEEKDAY) % 7
+        slot = (local - day * SECONDS_PER_DAY) // slot_seconds
+        totals += np.bincount(
+            weekday * slots_per_day + slot,
+            weights=records.value[block],
+            minlength=7 * slots_per_day,
+        )
+        # Distinct days in linear time, records span a few thousand days.
+        first_day = day.min()
+        days.append(np.flatnonzero(np.bincount(day - first_day)) + first_day)
+
+    # Average over the days with records on every weekday.
+    recorded_days = np.unique(np.concatenate(days or [np.zeros(0, int)]))
+    day_counts = np.bincount((recorded_days + EPOCH_WEEKDAY) % 7, minlength=7)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return totals.reshape(7, slots_per_day) / day_counts[:, np.newaxis]
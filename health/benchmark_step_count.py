@@ -0,0 +1,352 @@
+"""Step count benchmarks.
+
+Measures every ingestion mode of the step count tools on an export, for
+tracking performance regressions. Each mode runs in a fresh process, so that
+its peak resident set size is measured on its own, and reports the time spent
+in every phase:
+
+- parse: reading the step records from the export.
+- bucket: converting the record timestamps to local days.
+- aggregate: summing the steps per day.
+- load: parse, bucket and aggregate. The dom, stream and parallel modes fuse
+  them, so they report only the load time, without a split.
+- metrics: most steps, streaks, weekday means and distribution.
+- render: drawing the plots with a non-interactive backend.
+
+The peak resident set size is taken once the data is loaded, before the
+metrics and plots, whose libraries would otherwise dominate it.
+
+Usage:
+    python health/synthetic_export.py export.xml --records 1000000
+    python health/benchmark_step_count.py export.xml --json results.json
+"""
+
+import argparse
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from io import BytesIO
+from multiprocessing import get_context
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+from daily_series import DailySeries
+from health_export import (
+    STEP_COUNT_TYPE,
+    export_size,
+    open_export,
+    read_step_records,
+)
+from record_cache import cached_step_records
+from step_count import PLOT_METRICS, LoadOptions, load_data
+
+MODES = (
+    "dom",
+    "stream",
+    "parallel",
+    "columnar",
+    "columnar-parallel",
+    "cache-cold",
+    "cache-warm",
+)
+PHASES = ("parse", "bucket", "aggregate", "load", "metrics", "render")
+STEP_COUNT_MARKER = f'type="{STEP_COUNT_TYPE}"'.encode()
+MARKER_TAIL = len(STEP_COUNT_MARKER) - 1
+BLOCK_SIZE = 1 << 24
+STREAK_THRESHOLDS = range(1000, 30001, 500)
+
+
+def count_step_records(file_path: str) -> int:
+    """Count the step records of an export with a raw byte scan.
+
+    :param file_path: File path to health data.
+    :return: Number of step records.
+    """
+    count = 0
+    tail = b""
+    with open_export(file_path) as file:
+        while block := file.read(BLOCK_SIZE):
+            data = tail + block
+            count += data.count(STEP_COUNT_MARKER)
+            # Keep a partial marker at the end of the block for the next one,
+            # without counting a complete one twice.
+            tail = data[-MARKER_TAIL:]
+
+    return count
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process and its children.
+
+    :return: Peak resident set size in megabytes.
+    """
+    peak = max(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    )
+    # Linux reports kilobytes, macOS reports bytes.
+    scale = 1 << 20 if sys.platform == "darwin" else 1 << 10
+    return peak / scale
+
+
+def _timed(
+    timings: dict[str, float], phase: str, function: Callable, *args, **kwargs
+) -> Any:
+    """Call a function and record its duration.
+
+    :param timings: Dictionary with the phases and their duration.
+    :param phase: Name of the phase.
+    :param function: Function to call.
+    :return: Return value of the function.
+    """
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    timings[phase] = time.perf_counter() - start
+    return result
+
+
+def _compute_metrics(daily_steps: DailySeries, steps: int) -> None:
+    """Compute the step count metrics.
+
+    :param daily_steps: Daily step series.
+    :param steps: Number of steps for the longest streak.
+    """
+    daily_steps.most_steps()
+    daily_steps.longest_streak(steps)
+    daily_steps.streaks(STREAK_THRESHOLDS)
+    daily_steps.weekday_means()
+    daily_steps.cumulative()
+    daily_steps.distribution()
+
+
+def _render_plots(daily_steps: DailySeries) -> None:
+    """Render all step count plots to memory.
+
+    :param daily_steps: Daily step series.
+    """
+    # The import cost of the plotting libraries is part of the render phase.
+    # pylint: disable=import-outside-toplevel
+    import matplotlib
+
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    from step_plots import plot_metric
+
+    for metric in PLOT_METRICS:
+        plot_metric(metric, daily_steps)
+        plt.savefig(BytesIO(), format="png")
+        plt.close("all")
+
+
+def run_mode(
+    mode: str,
+    file_path: str,
+    workers: int,
+    steps: int,
+    cache_dir: Path,
+    render: bool = True,
+) -> dict[str, Any]:
+    """Benchmark a single ingestion mode.
+
+    :param mode: Name of the ingestion mode.
+    :param file_path: File path to health data.
+    :param workers: Number of worker processes for the parallel modes.
+    :param steps: Number of steps for the longest streak.
+    :param cache_dir: Cache directory for the cache modes.
+    :param render: Whether to benchmark the rendering of the plots.
+    :return: Dictionary with the phase timings and the peak memory of the
+        load.
+    """
+    timings = {}
+
+    if mode in ("dom", "stream", "parallel"):
+        options = {
+            "dom": LoadOptions(),
+            "stream": LoadOptions(stream=True),
+            "parallel": LoadOptions(workers=workers),
+        }[mode]
+        daily_steps = _timed(timings, "load", load_data, file_path, options)
+    else:
+        readers = {
+            "columnar": partial(read_step_records, file_path),
+            "columnar-parallel": partial(
+                read_step_records, file_path, workers
+            ),
+            "cache-cold": partial(
+                cached_step_records,
+                file_path,
+                cache_dir,
+                rebuild=True,
+                workers=workers,
+                record_types=[STEP_COUNT_TYPE],
+            ),
+            "cache-warm": partial(
+                cached_step_records,
+                file_path,
+                cache_dir,
+                record_types=[STEP_COUNT_TYPE],
+            ),
+        }
+        records = _timed(timings, "parse", readers[mode])
+        days = _timed(timings, "bucket", records.local_days)
+        daily_steps = _timed(
+            timings,
+            "aggregate",
+            DailySeries.from_day_totals,
+            days,
+            records.value,
+        )
+        timings["load"] = sum(timings.values())
+
+    peak_rss = peak_rss_mb()
+    _timed(timings, "metrics", _compute_metrics, daily_steps, steps)
+    if render:
+        _timed(timings, "render", _render_plots, daily_steps)
+
+    return {
+        "mode": mode,
+        "timings": timings,
+        "peak_rss_mb": peak_rss,
+    }
+
+
+def benchmark(
+    file_path: str,
+    modes: Optional[list[str]] = None,
+    workers: Optional[int] = None,
+    steps: int = 10000,
+    render: bool = True,
+) -> dict[str, Any]:
+    """Benchmark the ingestion modes, each in a fresh process.
+
+    :param file_path: File path to health data.
+    :param modes: Ingestion modes to benchmark, all if not given.
+    :param workers: Number of worker processes for the parallel modes.
+    :param steps: Number of steps for the longest streak.
+    :param render: Whether to benchmark the rendering of the plots.
+    :return: Dictionary with the export details and results per mode.
+    """
+    modes = [mode for mode in MODES if not modes or mode in modes]
+    workers = workers or os.cpu_count()
+    records = count_step_records(file_path)
+    file_size_mb = export_size(file_path) / (1 << 20)
+    results = []
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        cache_dir = Path(temp_dir, "cache")
+        context = get_context("spawn")
+        for mode in modes:
+            if mode == "cache-warm" and not cache_dir.exists():
+                # Warm the cache in a process of its own, so that its memory
+                # is not attributed to the warm mode.
+                with ProcessPoolExecutor(1, mp_context=context) as executor:
+                    executor.submit(
+                        cached_step_records,
+                        file_path,
+                        cache_dir,
+                        workers=workers,
+                        record_types=[STEP_COUNT_TYPE],
+                    ).result()
+
+            with ProcessPoolExecutor(1, mp_context=context) as executor:
+                result = executor.submit(
+                    run_mode,
+                    mode,
+                    file_path,
+                    workers,
+                    steps,
+                    cache_dir,
+                    render,
+                ).result()
+
+            load_time = result["timings"]["load"]
+            result["records_per_second"] = records / load_time
+            result["mb_per_second"] = file_size_mb / load_time
+            results.append(result)
+            print_result(result)
+
+    return {
+        "export": str(file_path),
+        "file_size_mb": file_size_mb,
+        "step_records": records,
+        "workers": workers,
+        "results": results,
+    }
+
+
+def print_result(result: dict[str, Any]) -> None:
+    """Print the result of a mode as a table row.
+
+    :param result: Result of a mode.
+    """
+    timings = [
+        (
+            f"{result['timings'][phase]:10.3f}"
+            if phase in result["timings"]
+            else f"{'-':>10}"
+        )
+        for phase in PHASES
+    ]
+    print(
+        f"{result['mode']:<18}{''.join(timings)}"
+        f"{result['records_per_second']:12.0f}"
+        f"{result['peak_rss_mb']:10.1f}"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark the step count ingestion modes."
+    )
+    parser.add_argument(
+        "file_path", type=str, help="The file path to the export.xml file"
+    )
+    parser.add_argument(
+        "-m",
+        "--modes",
+        nargs="+",
+        choices=MODES,
+        help="Ingestion modes to benchmark, all by default",
+    )
+    parser.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        help="Number of worker processes for the parallel modes",
+    )
+    parser.add_argument(
+        "-s",
+        "--steps",
+        type=int,
+        default=10000,
+        help="Number of steps for the longest streak",
+    )
+    parser.add_argument(
+        "--no-render",
+        action="store_true",
+        help="Do not benchmark the rendering of the plots",
+    )
+    parser.add_argument(
+        "--json", type=Path, help="Write the results to a JSON file"
+    )
+
+    args = parser.parse_args()
+    print(
+        f"{'mode':<18}"
+        + "".join(f"{phase:>10}" for phase in PHASES)
+        + f"{'records/s':>12}{'load MB':>10}"
+    )
+    report = benchmark(
+        args.file_path,
+        args.modes,
+        args.workers,
+        args.steps,
+        not args.no_render,
+    )
+    if args.json:
+        args.json.write_text(json.dumps(report, indent=2), encoding="utf-8")
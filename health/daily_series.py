@@ -0,0 +1,342 @@
+"""Daily step series.
+
+Array-backed daily step counts, with the step metrics computed as NumPy
+operations.
+"""
+
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import NamedTuple, Optional, Sequence
+
+import numpy as np
+from health_export import QuantityRecords
+
+EPOCH_DATE = date(1970, 1, 1)
+ROLLING_WINDOWS = (7, 30, 90)
+
+
+class Streaks(NamedTuple):
+    """Longest and current streak for a step count threshold."""
+
+    steps: int
+    longest_start: Optional[date]
+    longest_days: int
+    current_start: Optional[date]
+    current_days: int
+
+
+class RollingStats(NamedTuple):
+    """Rolling statistics of the recorded days for every day of a series.
+
+    ``zscore`` compares the steps of every recorded day with the mean and
+    standard deviation of the window of days before it, and is NaN for days
+    without records or without enough history.
+    """
+
+    window: int
+    mean: np.ndarray
+    std: np.ndarray
+    zscore: np.ndarray
+    count: np.ndarray
+
+
+@dataclass
+class DailySeries:
+    """Daily step counts from a start date.
+
+    ``steps[i]`` holds the steps on ``start + i`` days. Days without any
+    records are filled with zero and marked as not ``recorded``, so the
+    metrics only take days with data into account.
+    """
+
+    start: date
+    steps: np.ndarray
+    recorded: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.steps)
+
+    @classmethod
+    def from_day_totals(
+        cls, days: np.ndarray, totals: np.ndarray
+    ) -> "DailySeries":
+        """Create a series from step totals per day.
+
+        :param days: Day numbers since the Unix epoch, possibly repeated.
+        :param totals: Step count for each entry in ``days``.
+        :return: Daily step series.
+        """
+        days = np.asarray(days, dtype=np.int64)
+        if len(days) == 0:
+            empty = np.zeros(0, dtype=np.int64)
+            return cls(EPOCH_DATE, empty, empty.astype(bool))
+
+        first_day = int(days.min())
+        offsets = days - first_day
+        steps = np.bincount(offsets, weights=totals).astype(np.int64)
+        recorded = np.bincount(offsets, minlength=len(steps)) > 0
+
+        return cls(EPOCH_DATE + timedelta(days=first_day), steps, recorded)
+
+    @classmethod
+    def from_records(cls, records: QuantityRecords) -> "DailySeries":
+        """Create a series from columnar step records.
+
+        :param records: Columnar step records.
+        :return: Daily step series.
+        """
+        return cls.from_day_totals(records.local_days(), records.value)
+
+    @classmethod
+    def from_dict(cls, daily_steps: dict[date, int]) -> "DailySeries":
+        """Create a series from a dictionary of daily step counts.
+
+        :param daily_steps: Dictionary with the dates and respective steps.
+        :return: Daily step series.
+        """
+        epoch = EPOCH_DATE.toordinal()
+        days = np.fromiter(
+            (day.toordinal() - epoch for day in daily_steps),
+            dtype=np.int64,
+            count=len(daily_steps),
+        )
+        totals = np.fromiter(
+            daily_steps.values(), dtype=np.int64, count=len(daily_steps)
+        )
+        return cls.from_day_totals(days, totals)
+
+    def to_dict(self) -> dict[date, int]:
+        """Dictionary of the recorded days and their step counts.
+
+        :return: Dictionary with the dates and respective step count.
+        """
+        indices = np.flatnonzero(self.recorded)
+        return {
+            self.date_at(index): steps
+            for index, steps in zip(
+                indices.tolist(), self.steps[indices].tolist()
+            )
+        }
+
+    def combine(self, other: "DailySeries") -> "DailySeries":
+        """Add the step counts of another series to this one.
+
+        :param other: Daily step series to add.
+        :return: Daily step series covering the days of both series.
+        """
+        days = np.concatenate(
+            [
+                self.day_numbers()[self.recorded],
+                other.day_numbers()[other.recorded],
+            ]
+        )
+        totals = np.concatenate(
+            [self.steps[self.recorded], other.steps[other.recorded]]
+        )
+        return DailySeries.from_day_totals(days, totals)
+
+    def day_numbers(self) -> np.ndarray:
+        """Day numbers since the Unix epoch of all days in the series.
+
+        :return: Array of day numbers.
+        """
+        first_day = (self.start - EPOCH_DATE).days
+        return first_day + np.arange(len(self), dtype=np.int64)
+
+    def date_at(self, index: int) -> date:
+        """Date of a day in the series.
+
+        :param index: Offset of the day from the start date.
+        :return: Date of the day.
+        """
+        return self.start + timedelta(days=int(index))
+
+    def dates(self) -> np.ndarray:
+        """Dates of all days in the series.
+
+        :return: Array of ``datetime64[D]`` dates.
+        """
+        return np.datetime64(self.start, "D") + np.arange(len(self))
+
+    def weekdays(self) -> np.ndarray:
+        """Weekday of every day in the series, with Monday as 0.
+
+        :return: Array of weekdays.
+        """
+        return (self.start.weekday() + np.arange(len(self))) % 7
+
+    def cumulative(self) -> np.ndarray:
+        """Cumulative step count at the end of every day.
+
+        :return: Array of cumulative step counts.
+        """
+        return np.cumsum(self.steps)
+
+    def most_steps(self) -> tuple[date, int]:
+        """Find the day with the most steps.
+
+        :return: Day with most steps and respective step count.
+        """
+        if not self.recorded.any():
+            raise ValueError("The series has no recorded days.")
+
+        index = int(np.argmax(np.where(self.recorded, self.steps, -1)))
+        return self.date_at(index), int(self.steps[index])
+
+    def longest_streak(self, steps: int) -> tuple[Optional[date], int]:
+        """Find the longest streak of recorded days meeting a step count.
+
+        Days without records are skipped rather than ending a streak. Ties
+        are resolved in favour of the earliest streak.
+
+        :param steps: Number of steps to find the longest streak for.
+        :return: Longest streak start date and total number of days.
+        """
+        indices = np.flatnonzero(self.recorded)
+        meets = self.steps[indices] >= steps
+        if not meets.any():
+            return None, 0
+
+        # Streaks start where the padded flags rise and end where they fall.
+        edges = np.diff(np.concatenate(([0], meets.astype(np.int8), [0])))
+        starts = np.flatnonzero(edges == 1)
+        ends = np.flatnonzero(edges == -1)
+        longest = int(np.argmax(ends - starts))
+
+        return (
+            self.date_at(indices[starts[longest]]),
+            int(ends[longest] - starts[longest]),
+        )
+
+    def streaks(self, thresholds: Sequence[int]) -> list[Streaks]:
+        """Find the longest and current streaks for many step counts at once.
+
+        Streaks follow the semantics of `longest_streak`. Every recorded day
+        is the minimum of exactly one maximal window, found with a monotonic
+        stack in a single pass, and the longest streak for a threshold is the
+        longest window whose minimum meets it. The current streak is the run
+        of days up to the last recorded day, found from the suffix minima.
+        The total cost is O(n log n + k log n) for n days and k thresholds.
+
+        :param thresholds: Step counts to find the streaks for.
+        :return: Streaks for every threshold, in the given order.
+        """
+        indices = np.flatnonzero(self.recorded)
+        values = self.steps[indices].tolist()
+        count = len(values)
+
+        # Window of every day within which it is the minimum.
+        left, right = [0] * count, [count] * count
+        stack = []
+        for position, value in enumerate(values):
+            while stack and values[stack[-1]] >= value:
+                right[stack.pop()] = position
+            left[position] = stack[-1] + 1 if stack else 0
+            stack.append(position)
+
+        # Best window among the days with at least a given minimum: sort by
+        # minimum, descending, and keep a running best, preferring the
+        # longest and then the earliest window.
+        minima = np.array(values, dtype=np.int64)
+        starts = np.array(left, dtype=np.int64)
+        lengths = np.array(right, dtype=np.int64) - starts
+        order = np.argsort(-minima, kind="stable")
+        keys = lengths[order] * (count + 1) - starts[order]
+        best = order[np.maximum.accumulate(keys) == keys]
+        best_minima = -minima[best]
+
+        suffix_minima = np.minimum.accumulate(minima[::-1])[::-1]
+
+        results = []
+        for steps in thresholds:
+            longest_start, longest_days = None, 0
+            # Number of best-so-far entries whose minimum meets the threshold.
+            found = np.searchsorted(best_minima, -steps, side="right")
+            if found:
+                window = best[found - 1]
+                longest_start = self.date_at(indices[starts[window]])
+                longest_days = int(lengths[window])
+
+            current_start, current_days = None, 0
+            first = int(np.searchsorted(suffix_minima, steps, side="left"))
+            if first < count:
+                current_start = self.date_at(indices[first])
+                current_days = count - first
+
+            results.append(
+                Streaks(
+                    steps,
+                    longest_start,
+                    longest_days,
+                    current_start,
+                    current_days,
+                )
+            )
+
+        return results
+
+    def rolling(self, window: int, min_periods: int = 1) -> RollingStats:
+        """Rolling mean, standard deviation and z-score over a day window.
+
+        Every window holds the recorded days among the ``window`` calendar
+        days ending on a day. All windows are found at once from cumulative
+        sums of the steps and their squares, which are exact in integers, so
+        the cost does not depend on the window size.
+
+        :param window: Number of days in the window, e.g. 7, 30 or 90.
+        :param min_periods: Minimum number of recorded days in a window for
+            its statistics, NaN otherwise.
+        :return: Rolling statistics, one value per day of the series.
+        """
+        if window < 1:
+            raise ValueError("The window must be at least one day.")
+
+        steps = np.where(self.recorded, self.steps, 0).astype(np.int64)
+        sums = np.concatenate([[0], np.cumsum(steps)])
+        squares = np.concatenate([[0], np.cumsum(steps * steps)])
+        counts = np.concatenate([[0], np.cumsum(self.recorded)])
+
+        # Totals over the windows ending before every position, so that
+        # ``[1:]`` ends on every day and ``[:-1]`` on the day before it.
+        ends = np.arange(len(self) + 1)
+        starts = np.maximum(ends - window, 0)
+        count = counts[ends] - counts[starts]
+        total = sums[ends] - sums[starts]
+        square_total = squares[ends] - squares[starts]
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = np.where(count >= min_periods, total / count, np.nan)
+            variance = (count * square_total - total * total) / (count * count)
+            std = np.where(count >= min_periods, np.sqrt(variance), np.nan)
+            zscore = (steps - mean[:-1]) / std[:-1]
+
+        zscore[~self.recorded | ~np.isfinite(zscore)] = np.nan
+
+        return RollingStats(window, mean[1:], std[1:], zscore, count[1:])
+
+    def weekday_means(self) -> np.ndarray:
+        """Average steps of the recorded days for each weekday.
+
+        :return: Array of seven averages, from Monday to Sunday.
+        """
+        weekdays = self.weekdays()[self.recorded]
+        totals = np.bincount(
+            weekdays, weights=self.steps[self.recorded], minlength=7
+        )
+        counts = np.bincount(weekdays, minlength=7)
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return totals / counts
+
+    def distribution(self) -> tuple[float, float, int, int]:
+        """Summary statistics of the recorded daily step counts.
+
+        :return: Mean, standard deviation, minimum and maximum.
+        """
+        steps = self.steps[self.recorded]
+        return (
+            float(np.mean(steps)),
+            float(np.std(steps)),
+            int(np.min(steps)),
+            int(np.max(steps)),
+        )
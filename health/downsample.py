@@ -0,0 +1,120 @@
+"""Plot downsampling.
+
+Reduces a series to a bounded number of points before it is plotted, so that
+render time and image size do not grow with the number of records, while
+keeping the visual shape of the series. Both methods select points of the
+original series rather than averaging them, so peaks and dips are kept.
+"""
+
+import numpy as np
+
+MAX_PLOT_POINTS = 2000
+METHODS = ("lttb", "minmax")
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, max_points: int) -> np.ndarray:
+    """Select points with the largest-triangle-three-buckets algorithm.
+
+    The first and last points are kept, and the points in between are split
+    into equal buckets. From every bucket, the point forming the largest
+    triangle with the previously selected point and the average of the next
+    bucket is selected.
+
+    :param x: X values, in increasing order.
+    :param y: Y values.
+    :param max_points: Maximum number of points to select, at least 3.
+    :return: Indices of the selected points, in increasing order.
+    """
+    count = len(y)
+    if count <= max_points or max_points < 3:
+        return np.arange(count)
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    buckets = max_points - 2
+    edges = (np.arange(buckets + 1) * (count - 2) // buckets + 1).tolist()
+
+    # Average of the bucket following every bucket, the last point following
+    # the final bucket.
+    x_sums = np.concatenate([[0.0], np.cumsum(x)])
+    y_sums = np.concatenate([[0.0], np.cumsum(y)])
+    starts = np.array(edges[1:])
+    ends = np.array(edges[2:] + [count])
+    sizes = ends - starts
+    x_means = (x_sums[ends] - x_sums[starts]) / sizes
+    y_means = (y_sums[ends] - y_sums[starts]) / sizes
+
+    selected = np.empty(max_points, dtype=np.int64)
+    selected[0], selected[-1] = 0, count - 1
+    previous = 0
+    for bucket in range(buckets):
+        start, end = edges[bucket], edges[bucket + 1]
+        areas = np.abs(
+            (x[previous] - x_means[bucket]) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (y_means[bucket] - y[previous])
+        )
+        previous = start + int(np.argmax(areas))
+        selected[bucket + 1] = previous
+
+    return selected
+
+
+def min_max_indices(y: np.ndarray, max_points: int) -> np.ndarray:
+    """Select the minimum and maximum of equal bins of points.
+
+    Keeps the extremes of every bin, as a plot at one bin per pixel would
+    show them, in linear time.
+
+    :param y: Y values.
+    :param max_points: Maximum number of points to select, at least 4.
+    :return: Indices of the selected points, in increasing order.
+    """
+    count = len(y)
+    if count <= max_points or max_points < 4:
+        return np.arange(count)
+
+    y = np.asarray(y)
+    # Two points per bin, and the first and last points.
+    bins = (max_points - 2) // 2
+    starts = np.arange(bins) * count // bins
+    sizes = np.diff(np.append(starts, count))
+    bin_ids = np.repeat(np.arange(bins), sizes)
+
+    indices = []
+    for extreme in (np.minimum, np.maximum):
+        extremes = np.repeat(extreme.reduceat(y, starts), sizes)
+        # The first point of every bin that reaches the extreme.
+        candidates = np.flatnonzero(y == extremes)
+        _, first = np.unique(bin_ids[candidates], return_index=True)
+        indices.append(candidates[first])
+
+    return np.unique(np.concatenate(indices + [[0, count - 1]]))
+
+
+def downsample(
+    x: np.ndarray,
+    y: np.ndarray,
+    max_points: int = MAX_PLOT_POINTS,
+    method: str = "lttb",
+) -> tuple[np.ndarray, np.ndarray]:
+    """Downsample a series for plotting.
+
+    Series within the point budget are returned unchanged.
+
+    :param x: X values, in increasing order, numbers or datetimes.
+    :param y: Y values.
+    :param max_points: Maximum number of points to keep.
+    :param method: Downsampling method: lttb or minmax.
+    :return: Downsampled x and y values.
+    """
+    if method == "lttb":
+        numeric_x = x.astype(np.int64) if x.dtype.kind == "M" else x
+        indices = lttb_indices(numeric_x, y, max_points)
+    elif method == "minmax":
+        indices = min_max_indices(y, max_points)
+    else:
+        raise ValueError(
+            f"Invalid downsampling method {method!r}. Use one of {METHODS}."
+        )
+
+    return x[indices], y[indices]
@@ -0,0 +1,714 @@
+"""Apple Health export parsing.
+
+Helpers for reading records from an Apple Health ``export.xml`` file, either
+as XML elements or as columnar NumPy arrays. All selected quantity types are
+read in a single pass over the export, each into its own columnar store.
+The ``export.zip`` archive produced by the Health app is read directly,
+decompressing ``export.xml`` on the fly without writing it to disk.
+
+Exports write the records of a type sorted by start date, so the records of
+an ``export.xml`` that can end after a given time are found by bisection and
+only the end of the file is parsed.
+"""
+
+import html
+import mmap
+import os
+import re
+import xml.etree.ElementTree as ET
+import zipfile
+from collections import defaultdict, deque
+from concurrent.futures import Executor, ProcessPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta, timezone
+from functools import partial
+from typing import IO, Callable, Collection, Iterable, Iterator, Optional
+
+import numpy as np
+from timestamps import SECONDS_PER_DAY, parse_local_days, parse_timestamps
+
+QUANTITY_TYPE_PREFIX = "HKQuantityTypeIdentifier"
+STEP_COUNT_TYPE = "HKQuantityTypeIdentifierStepCount"
+EXPORT_MEMBER = "apple_health_export/export.xml"
+
+MIN_CHUNK_SIZE = 1 << 20
+MAX_CHUNK_SIZE = 64 << 20
+RECORD_MARKER = b"<Record"
+MARKER_TAIL = len(RECORD_MARKER) - 1
+RECORD_PATTERN = re.compile(rb'<Record((?:\s+[\w:]+\s*=\s*"[^"]*")*)\s*/?>')
+ATTRIBUTE_PATTERN = re.compile(rb'([\w:]+)\s*=\s*"([^"]*)"')
+START_DATE_PATTERN = re.compile(rb'\sstartDate\s*=\s*"(\d{4}-\d{2}-\d{2})')
+
+
+@dataclass
+class QuantityRecords:
+    """Columnar quantity records of a single type.
+
+    Timestamps are seconds since the Unix epoch (UTC), and ``utc_offset`` is
+    the offset of the recorded local time, in seconds. ``local_day`` is the
+    local start date as days since the Unix epoch. Sources are stored as
+    indices into ``sources``.
+    """
+
+    start: np.ndarray
+    end: np.ndarray
+    utc_offset: np.ndarray
+    local_day: np.ndarray
+    value: np.ndarray
+    source: np.ndarray
+    sources: list[str]
+
+    def __len__(self) -> int:
+        return len(self.start)
+
+    @classmethod
+    def empty(cls) -> "QuantityRecords":
+        """Create records without any entries.
+
+        :return: Empty columnar records.
+        """
+        return _Columns().build()
+
+    def local_days(self) -> np.ndarray:
+        """Local start date of every record as days since the Unix epoch.
+
+        :return: Array of day numbers.
+        """
+        return self.local_day
+
+
+class _Columns:
+    """Builder for the columns of one record type.
+
+    The raw attributes are collected first and converted into arrays in
+    bulk, so that the timestamps are parsed with vectorised operations.
+    """
+
+    def __init__(self):
+        self.starts, self.ends, self.values, self.sources = [], [], [], []
+        self.source_ids: dict[str, int] = {}
+
+    def append(
+        self, start: str, end: str, value: str, source_name: str
+    ) -> None:
+        """Append a record.
+
+        :param start: Raw start date of the record.
+        :param end: Raw end date of the record.
+        :param value: Raw record value.
+        :param source_name: Name of the record source.
+        """
+        self.starts.append(start)
+        self.ends.append(end)
+        self.values.append(value)
+        self.sources.append(
+            self.source_ids.setdefault(source_name, len(self.source_ids))
+        )
+
+    def build(self, since: Optional[int] = None) -> QuantityRecords:
+        """Convert the appended records into arrays.
+
+        :param since: Only keep records ending after this many seconds since
+            the Unix epoch.
+        :return: Columnar records.
+        """
+        start, utc_offset = parse_timestamps(self.starts)
+        end, _ = parse_timestamps(self.ends)
+        local_day = parse_local_days(self.starts)
+        keep = np.ones(len(end), dtype=bool) if since is None else end > since
+
+        return QuantityRecords(
+            start=start[keep],
+            end=end[keep],
+            utc_offset=utc_offset[keep],
+            local_day=local_day[keep],
+            value=np.asarray(self.values, dtype=str).astype(np.float64)[keep],
+            source=np.array(self.sources, dtype=np.int16)[keep],
+            sources=list(self.source_ids),
+        )
+
+
+def is_selected(
+    record_type: Optional[str], record_types: Optional[Collection[str]]
+) -> bool:
+    """Check whether a record type is selected.
+
+    :param record_type: Type of the record.
+    :param record_types: Selected record types, or `None` to select every
+        quantity type.
+    :return: `True` if the record type is selected, otherwise `False`.
+    """
+    if record_types is None:
+        return record_type is not None and record_type.startswith(
+            QUANTITY_TYPE_PREFIX
+        )
+    return record_type in record_types
+
+
+def _export_member(archive: zipfile.ZipFile) -> zipfile.ZipInfo:
+    """Find the ``export.xml`` member of an export archive.
+
+    :param archive: Export archive.
+    :return: Member information of the export.
+    """
+    members = [
+        info
+        for info in archive.infolist()
+        if info.filename == EXPORT_MEMBER
+        or info.filename.rsplit("/", 1)[-1] == "export.xml"
+    ]
+    if not members:
+        raise ValueError(f"No export.xml found in {archive.filename}")
+    # Prefer the standard location, then the shallowest member.
+    members.sort(
+        key=lambda info: (
+            info.filename != EXPORT_MEMBER,
+            info.filename.count("/"),
+        )
+    )
+    return members[0]
+
+
+@contextmanager
+def open_export(file_path: str) -> Iterator[IO[bytes]]:
+    """Open an export for reading, either ``export.xml`` or ``export.zip``.
+
+    The export of an archive is decompressed as it is read.
+
+    :param file_path: File path to health data.
+    :return: Context manager of a binary file object of the export XML.
+    """
+    if not zipfile.is_zipfile(file_path):
+        with open(file_path, "rb") as file:
+            yield file
+        return
+
+    with zipfile.ZipFile(file_path) as archive:
+        with archive.open(_export_member(archive)) as file:
+            yield file
+
+
+def export_size(file_path: str) -> int:
+    """Size of the export XML, decompressed for an archive.
+
+    :param file_path: File path to health data.
+    :return: Size in bytes.
+    """
+    if not zipfile.is_zipfile(file_path):
+        return os.path.getsize(file_path)
+    with zipfile.ZipFile(file_path) as archive:
+        return _export_member(archive).file_size
+
+
+def iter_records(
+    file_path: str,
+    record_types: Optional[Collection[str]] = (STEP_COUNT_TYPE,),
+) -> Iterator[ET.Element]:
+    """Stream the records of the given types from a health data export.
+
+    The export is parsed incrementally and every processed element is cleared
+    from the tree, so memory usage does not depend on the size of the file.
+    The yielded element is only valid until the next record is requested.
+
+    :param file_path: File path to health data.
+    :param record_types: Record types to yield, or `None` for every quantity
+        type.
+    :return: Iterator over the matching record elements.
+    """
+    with open_export(file_path) as file:
+        context = ET.iterparse(file, events=("start", "end"))
+        _, root = next(context)
+
+        for event, elem in context:
+            if event != "end" or elem.tag != "Record":
+                continue
+            if is_selected(elem.get("type"), record_types):
+                yield elem
+            # Drop the processed record, and any sibling elements seen before
+            # it, from the partially built tree.
+            elem.clear()
+            root.clear()
+
+
+def _date_cutoff(since: Optional[int]) -> str:
+    """Earliest local date on which a timestamp after ``since`` can fall.
+
+    Local dates are at most one day behind the UTC date, so any timestamp
+    whose date part sorts before the cutoff is at or before ``since``.
+
+    :param since: Seconds since the Unix epoch, or `None`.
+    :return: Cutoff date as ``YYYY-MM-DD``, or an empty string.
+    """
+    if since is None:
+        return ""
+    since_date = datetime.fromtimestamp(since, timezone.utc).date()
+    return (since_date - timedelta(days=1)).isoformat()
+
+
+def _rows_to_columns(
+    rows: Iterable[tuple[str, str, str, str, str]],
+    since: Optional[int] = None,
+) -> dict[str, QuantityRecords]:
+    """Route record attributes into columnar arrays per record type.
+
+    :param rows: Type, start date, end date, value and source name of each
+        record.
+    :param since: Only keep records ending after this many seconds since the
+        Unix epoch.
+    :return: Dictionary with the record types and respective records.
+    """
+    columns = defaultdict(_Columns)
+    cutoff = _date_cutoff(since)
+
+    for record_type, start, end, value, source_name in rows:
+        # Fast-forward through old records without parsing their dates.
+        if end[:10] < cutoff:
+            continue
+        columns[record_type].append(start, end, value, source_name)
+
+    return {
+        record_type: builder.build(since)
+        for record_type, builder in columns.items()
+    }
+
+
+def concatenate_records(
+    chunks: Iterable[QuantityRecords],
+) -> QuantityRecords:
+    """Concatenate columnar records, merging their source names.
+
+    :param chunks: Records of the same type to concatenate, in order.
+    :return: Combined records.
+    """
+    chunks = [QuantityRecords.empty(), *chunks]
+    source_ids: dict[str, int] = {}
+    sources = []
+
+    for chunk in chunks:
+        mapping = np.array(
+            [
+                source_ids.setdefault(name, len(source_ids))
+                for name in chunk.sources
+            ],
+            dtype=np.int16,
+        )
+        sources.append(mapping[chunk.source] if len(chunk) else chunk.source)
+
+    return QuantityRecords(
+        start=np.concatenate([chunk.start for chunk in chunks]),
+        end=np.concatenate([chunk.end for chunk in chunks]),
+        utc_offset=np.concatenate([chunk.utc_offset for chunk in chunks]),
+        local_day=np.concatenate([chunk.local_day for chunk in chunks]),
+        value=np.concatenate([chunk.value for chunk in chunks]),
+        source=np.concatenate(sources),
+        sources=list(source_ids),
+    )
+
+
+def merge_records(
+    chunks: Iterable[dict[str, QuantityRecords]],
+) -> dict[str, QuantityRecords]:
+    """Merge per-type columnar records, concatenating each type in order.
+
+    :param chunks: Dictionaries with the record types and their records.
+    :return: Dictionary with the record types and combined records.
+    """
+    per_type = defaultdict(list)
+    for chunk in chunks:
+        for record_type, records in chunk.items():
+            per_type[record_type].append(records)
+
+    return {
+        record_type: concatenate_records(records)
+        for record_type, records in per_type.items()
+    }
+
+
+def find_record_boundaries(
+    file_path: str,
+    chunk_size: int,
+    start: int = 0,
+    end: Optional[int] = None,
+) -> list[int]:
+    """Split an export into byte ranges that start at a record tag.
+
+    :param file_path: File path to health data.
+    :param chunk_size: Approximate size of each range, in bytes.
+    :param start: Offset of the first range, at a record tag.
+    :param end: Offset of the end of the last range, the file size if not
+        given.
+    :return: Sorted offsets, from the start to the end.
+    """
+    if end is None:
+        end = os.path.getsize(file_path)
+    boundaries = [start]
+
+    with open(file_path, "rb") as file:
+        offset = start + chunk_size
+        while offset < end:
+            file.seek(offset)
+            tail = b""
+            while True:
+                block = file.read(MIN_CHUNK_SIZE)
+                if not block:
+                    position = end
+                    break
+                index = (tail + block).find(RECORD_MARKER)
+                if index >= 0:
+                    position = file.tell() - len(block) - len(tail) + index
+                    break
+                # Keep enough of the block to find a marker split across
+                # two reads.
+                tail = block[-MARKER_TAIL:]
+
+            if position >= end:
+                break
+            boundaries.append(position)
+            offset = position + chunk_size
+
+    boundaries.append(end)
+    return boundaries
+
+
+def iter_stream_chunks(file: IO[bytes], chunk_size: int) -> Iterator[bytes]:
+    """Split a sequential export stream into chunks that end at a record tag.
+
+    Used for compressed exports, which cannot be read at arbitrary offsets.
+
+    :param file: Binary file object of the export XML.
+    :param chunk_size: Approximate size of each chunk, in bytes.
+    :return: Iterator over the chunks, in file order.
+    """
+    buffer = b""
+    while block := file.read(chunk_size):
+        buffer += block
+        # Cut before the last record tag, which may not be complete yet.
+        cut = buffer.rfind(RECORD_MARKER)
+        if cut > 0:
+            yield buffer[:cut]
+            buffer = buffer[cut:]
+    if buffer:
+        yield buffer
+
+
+def _chunk_size(file_size: int, workers: int) -> int:
+    """Chunk size giving every worker several chunks to balance the load.
+
+    :param file_size: Size of the export XML, in bytes.
+    :param workers: Number of worker processes.
+    :return: Chunk size in bytes.
+    """
+    target = file_size // (4 * workers)
+    return min(MAX_CHUNK_SIZE, max(MIN_CHUNK_SIZE, target))
+
+
+def _apply_to_range(
+    function: Callable[[bytes], object], file_path: str, start: int, end: int
+) -> object:
+    """Apply a chunk function to a byte range of an export file.
+
+    :param function: Function taking the bytes of a chunk.
+    :param file_path: File path to health data.
+    :param start: Offset of the first byte of the range.
+    :param end: Offset one past the last byte of the range.
+    :return: Result of the function.
+    """
+    with open(file_path, "rb") as file:
+        file.seek(start)
+        data = file.read(end - start)
+    return function(data)
+
+
+def _iter_chunk_records(
+    data: bytes, record_types: Optional[Collection[str]]
+) -> Iterator[tuple[str, dict[bytes, bytes]]]:
+    """Yield the raw attributes of records whose tag starts in a chunk.
+
+    :param data: Chunk of the export XML.
+    :param record_types: Record types to yield, or `None` for every quantity
+        type.
+    :return: Iterator over the record types and attribute dictionaries.
+    """
+    for match in RECORD_PATTERN.finditer(data):
+        attributes = dict(ATTRIBUTE_PATTERN.findall(match.group(1)))
+        record_type = attributes.get(b"type", b"").decode()
+        if is_selected(record_type, record_types):
+            yield record_type, attributes
+
+
+def _decode(value: bytes) -> str:
+    """Decode a raw attribute value, resolving character references.
+
+    :param value: Raw attribute value.
+    :return: Attribute value as a string.
+    """
+    text = value.decode("utf-8")
+    return html.unescape(text) if "&" in text else text
+
+
+def _count_chunk_steps(data: bytes) -> dict[bytes, int]:
+    """Sum the steps in a chunk of an export per local start date.
+
+    :param data: Chunk of the export XML.
+    :return: Dictionary with the raw dates and respective step count.
+    """
+    totals = defaultdict(int)
+    for _, attributes in _iter_chunk_records(data, (STEP_COUNT_TYPE,)):
+        # The local date is the date part of the timestamp.
+        totals[attributes[b"startDate"][:10]] += int(attributes[b"value"])
+    return totals
+
+
+def _read_chunk_records(
+    data: bytes,
+    record_types: Optional[Collection[str]] = None,
+    since: Optional[int] = None,
+) -> dict[str, QuantityRecords]:
+    """Read the records in a chunk of an export into columnar arrays.
+
+    :param data: Chunk of the export XML.
+    :param record_types: Record types to read, or `None` for every quantity
+        type.
+    :param since: Only keep records ending after this many seconds since the
+        Unix epoch.
+    :return: Dictionary with the record types and respective records.
+    """
+    rows = (
+        (
+            record_type,
+            _decode(attributes[b"startDate"]),
+            _decode(attributes[b"endDate"]),
+            _decode(attributes[b"value"]),
+            _decode(attributes.get(b"sourceName", b"")),
+        )
+        for record_type, attributes in _iter_chunk_records(data, record_types)
+    )
+    return _rows_to_columns(rows, since)
+
+
+def _map_bounded(
+    executor: Executor, calls: Iterable[tuple], window: int
+) -> Iterator:
+    """Submit calls to an executor with a bounded number in flight.
+
+    Unlike ``Executor.map``, the calls are only consumed as results are
+    taken, so chunks read from a stream are not all held in memory at once.
+
+    :param executor: Executor to submit the calls to.
+    :param calls: Iterable of function and argument tuples.
+    :param window: Maximum number of submitted calls without a taken result.
+    :return: Iterator over the results, in submission order.
+    """
+    pending = deque()
+    for function, *args in calls:
+        pending.append(executor.submit(function, *args))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def _map_chunks(
+    function: Callable[[bytes], object],
+    file_path: str,
+    workers: int,
+    start: int = 0,
+    end: Optional[int] = None,
+) -> Iterator:
+    """Apply a chunk function to every chunk of an export in parallel.
+
+    Workers read the byte ranges of an export file themselves. An archive
+    is decompressed once, sequentially, and its chunks are sent to the
+    workers.
+
+    :param function: Function taking the bytes of a chunk.
+    :param file_path: File path to health data.
+    :param workers: Number of worker processes.
+    :param start: Offset of a record tag of an export file to start at, an
+        archive is always read whole.
+    :param end: Offset of an export file to stop at, its size if not given.
+    :return: Iterator over the chunk results, in file order.
+    """
+    size = export_size(file_path) if end is None else end
+    chunk_size = _chunk_size(size - start, workers)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        if zipfile.is_zipfile(file_path):
+            with open_export(file_path) as file:
+                calls = (
+                    (function, data)
+                    for data in iter_stream_chunks(file, chunk_size)
+                )
+                yield from _map_bounded(executor, calls, 2 * workers)
+        else:
+            boundaries = find_record_boundaries(
+                file_path, chunk_size, start, end
+            )
+            calls = (
+                (_apply_to_range, function, file_path, start, end)
+                for start, end in zip(boundaries[:-1], boundaries[1:])
+            )
+            yield from _map_bounded(executor, calls, 4 * workers)
+
+
+def _find_record(
+    data: mmap.mmap, marker: bytes, start: int, end: int
+) -> Optional[tuple[int, bytes]]:
+    """Find the first record of a type whose type attribute is in a range.
+
+    :param data: Memory-mapped export XML.
+    :param marker: Type attribute of the records, e.g. ``type="..."``.
+    :param start: Offset to search from.
+    :param end: Offset to search to, exclusive.
+    :return: Offset of the record tag and its local start date as
+        ``YYYY-MM-DD``, or `None` if there is no such record.
+    """
+    position = data.find(marker, start, end)
+    while position >= 0:
+        tag_start = data.rfind(b"<", 0, position)
+        if data.find(RECORD_MARKER, tag_start, position) == tag_start:
+            tag_end = data.find(b">", position)
+            match = START_DATE_PATTERN.search(data, tag_start, tag_end)
+            return tag_start, match.group(1) if match else b""
+        # The type of another element, e.g. the statistics of a workout.
+        position = data.find(marker, position + 1, end)
+    return None
+
+
+def find_records_since(
+    file_path: str, record_type: str, since: int
+) -> tuple[int, int]:
+    """Byte range of the records of a type that may end after a time.
+
+    The records of a type are sorted by start date, so the range is found
+    by bisection over the records, reading only a few of them. Records that
+    start more than a day before ``since`` are taken to have ended by then.
+
+    :param file_path: File path to an uncompressed ``export.xml``.
+    :param record_type: Type of the records.
+    :param since: Seconds since the Unix epoch.
+    :return: Offset of the first record tag, and offset of the end of the
+        tag of the last record of the type, both the same if no record of
+        the type may end after ``since``.
+    """
+    # Local dates are at most a day off, and records last at most a day.
+    cutoff = _date_cutoff(since - SECONDS_PER_DAY).encode()
+    marker = f' type="{record_type}"'.encode()
+    with open(file_path, "rb") as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            return 0, 0
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            # Every record of the type before low starts before the cutoff,
+            # and the first one at or after high, if any, does not.
+            low, high = 0, len(data)
+            while low < high:
+                middle = (low + high) // 2
+                record = _find_record(data, marker, middle, high)
+                if record is None:
+                    high = middle
+                elif record[1] < cutoff:
+                    low = data.find(b">", record[0]) + 1
+                else:
+                    high = middle
+            record = _find_record(data, marker, low, len(data))
+            if record is None:
+                return len(data), len(data)
+            last = data.rfind(marker)
+            return record[0], data.find(b">", last) + 1
+
+
+def parallel_daily_steps(
+    file_path: str, workers: int
+) -> defaultdict[datetime, int]:
+    """Count the daily steps of an export with a pool of processes.
+
+    The export is split into byte ranges aligned on record tags, the steps of
+    every range are summed per day by a worker and the per-range totals are
+    merged in file order.
+
+    :param file_path: File path to health data.
+    :param workers: Number of worker processes.
+    :return: Dictionary with the dates and respective step count.
+    """
+    daily_steps = defaultdict(int)
+    for totals in _map_chunks(_count_chunk_steps, file_path, workers):
+        for day, steps in totals.items():
+            daily_steps[date.fromisoformat(day.decode())] += steps
+
+    return daily_steps
+
+
+def read_records(
+    file_path: str,
+    record_types: Optional[Collection[str]] = None,
+    workers: Optional[int] = None,
+    since: Optional[int] = None,
+) -> dict[str, QuantityRecords]:
+    """Read the records of the selected types in a single pass.
+
+    :param file_path: File path to health data.
+    :param record_types: Record types to read, or `None` for every quantity
+        type.
+    :param workers: Number of worker processes, parse serially if not given.
+    :param since: Only keep records ending after this many seconds since the
+        Unix epoch. The older records of a single type are skipped without
+        being parsed, unless the export is an archive.
+    :return: Dictionary with the record types and respective records.
+    """
+    read_chunk = partial(
+        _read_chunk_records, record_types=record_types, since=since
+    )
+    if (
+        since is not None
+        and record_types is not None
+        and len(record_types) == 1
+        and not zipfile.is_zipfile(file_path)
+    ):
+        (record_type,) = record_types
+        start, end = find_records_since(file_path, record_type, since)
+        if workers:
+            chunks = _map_chunks(read_chunk, file_path, workers, start, end)
+        else:
+            chunk_size = _chunk_size(end - start, 1)
+            boundaries = find_record_boundaries(
+                file_path, chunk_size, start, end
+            )
+            chunks = (
+                _apply_to_range(read_chunk, file_path, range_start, range_end)
+                for range_start, range_end in zip(
+                    boundaries[:-1], boundaries[1:]
+                )
+            )
+        return merge_records(chunks)
+
+    if workers:
+        return merge_records(_map_chunks(read_chunk, file_path, workers))
+
+    rows = (
+        (
+            record.get("type"),
+            record.get("startDate"),
+            record.get("endDate"),
+            record.get("value"),
+            record.get("sourceName", ""),
+        )
+        for record in iter_records(file_path, record_types)
+    )
+    return _rows_to_columns(rows, since)
+
+
+def read_step_records(
+    file_path: str,
+    workers: Optional[int] = None,
+    since: Optional[int] = None,
+) -> QuantityRecords:
+    """Read all step records of an export into columnar arrays.
+
+    :param file_path: File path to health data.
+    :param workers: Number of worker processes, parse serially if not given.
+    :param since: Only keep records ending after this many seconds since the
+        Unix epoch.
+    :return: Columnar step records.
+    """
+    records = read_records(file_path, (STEP_COUNT_TYPE,), workers, since)
+    return records.get(STEP_COUNT_TYPE, QuantityRecords.empty())
@@ -0,0 +1,176 @@
+"""Step interval index.
+
+Step records from different sources, such as an iPhone and an Apple Watch,
+cover overlapping time intervals, so summing them double-counts steps. The
+index merges the records of all sources into disjoint time slices, keeping
+only the highest priority source that covers each slice, and spreads every
+record's steps evenly over its interval.
+
+The merged steps are stored as a cumulative step count at every slice
+boundary, so the steps in any time window are found by binary search and
+linear interpolation, without scanning the records again.
+"""
+
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional, Sequence, Union
+
+import numpy as np
+from health_export import QuantityRecords
+
+Timestamp = Union[datetime, float, np.ndarray]
+
+
+def _to_seconds(timestamp: Timestamp) -> Union[float, np.ndarray]:
+    """Convert a timestamp to seconds since the Unix epoch.
+
+    :param timestamp: Timezone-aware datetime, or seconds since the epoch.
+    :return: Seconds since the Unix epoch.
+    :raises ValueError: If the datetime is naive, as it would be read in the
+        local timezone of the machine.
+    """
+    if isinstance(timestamp, datetime):
+        if timestamp.tzinfo is None:
+            raise ValueError(f"Timestamp {timestamp} has no UTC offset.")
+        return timestamp.timestamp()
+    return timestamp
+
+
+def source_order(
+    sources: list[str], priority: Optional[Sequence[str]] = None
+) -> list[int]:
+    """Order source indices from the highest to the lowest priority.
+
+    :param sources: Source names of the records.
+    :param priority: Source names in order of priority, sources that are not
+        listed follow in their original order.
+    :return: Source indices, highest priority first.
+    """
+    priority = list(priority or [])
+    ranks = {name: rank for rank, name in enumerate(priority)}
+    return sorted(
+        range(len(sources)),
+        key=lambda index: (ranks.get(sources[index], len(priority)), index),
+    )
+
+
+def _covering_sum(
+    first: np.ndarray,
+    last: np.ndarray,
+    slices: int,
+    weights: Optional[np.ndarray] = None,
+) -> np.ndarray:
+    """Sum the weights of the intervals covering each slice.
+
+    :param first: Index of the first slice of every interval.
+    :param last: Index one past the last slice of every interval.
+    :param slices: Number of slices.
+    :param weights: Weight of every interval, 1 if not given.
+    :return: Sum of the weights per slice.
+    """
+    changes = np.bincount(first, weights, minlength=slices + 1) - np.bincount(
+        last, weights, minlength=slices + 1
+    )
+    return np.cumsum(changes[:-1])
+
+
+@dataclass
+class StepIntervalIndex:
+    """Cumulative steps at the boundaries of merged time slices.
+
+    ``cumulative[i]`` is the number of steps taken before ``boundaries[i]``,
+    in seconds since the Unix epoch. Steps are spread evenly within a slice.
+    """
+
+    boundaries: np.ndarray
+    cumulative: np.ndarray
+
+    @classmethod
+    def from_records(
+        cls,
+        records: QuantityRecords,
+        priority: Optional[Sequence[str]] = None,
+    ) -> "StepIntervalIndex":
+        """Build the index from step records.
+
+        All record boundaries are sorted into elementary slices, and each
+        source's step rate per slice is found from a difference array, which
+        takes O(n log n) time overall.
+
+        :param records: Columnar step records.
+        :param priority: Source names in order of priority.
+        :return: Step interval index.
+        """
+        starts = np.asarray(records.start, dtype=np.int64)
+        # Treat instantaneous records as lasting one second.
+        ends = np.maximum(np.asarray(records.end, dtype=np.int64), starts + 1)
+        rates = np.asarray(records.value, dtype=np.float64) / (ends - starts)
+
+        boundaries = np.unique(np.concatenate([starts, ends]))
+        if len(boundaries) == 0:
+            return cls(np.zeros(1, dtype=np.int64), np.zeros(1))
+
+        first = np.searchsorted(boundaries, starts)
+        last = np.searchsorted(boundaries, ends)
+        slices = len(boundaries) - 1
+
+        slice_rates = np.zeros(slices)
+        assigned = np.zeros(slices, dtype=bool)
+        for source in source_order(records.sources, priority):
+            mask = np.asarray(records.source) == source
+            covered = _covering_sum(first[mask], last[mask], slices) > 0
+            rates_sum = _covering_sum(
+                first[mask], last[mask], slices, rates[mask]
+            )
+            selected = covered & ~assigned
+            slice_rates[selected] = rates_sum[selected]
+            assigned |= covered
+
+        slice_steps = slice_rates * np.diff(boundaries)
+        cumulative = np.concatenate([[0.0], np.cumsum(slice_steps)])
+
+        return cls(boundaries, cumulative)
+
+    def steps_before(self, timestamp: Timestamp) -> Union[float, np.ndarray]:
+        """Cumulative number of steps taken before a point in time.
+
+        :param timestamp: Timezone-aware datetime, or seconds since the Unix
+            epoch, either scalar or an array.
+        :return: Cumulative step count.
+        """
+        return np.interp(
+            _to_seconds(timestamp), self.boundaries, self.cumulative
+        )
+
+    def steps_between(
+        self, start: Timestamp, end: Timestamp
+    ) -> Union[float, np.ndarray]:
+        """Number of steps in a time window.
+
+        :param start: Start of the window.
+        :param end: End of the window.
+        :return: Step count in the window.
+        """
+        return self.steps_before(end) - self.steps_before(start)
+
+    def binned_steps(
+        self, start: Timestamp, end: Timestamp, bin_seconds: int
+    ) -> np.ndarray:
+        """Number of steps in consecutive fixed-size windows.
+
+        :param start: Start of the first window.
+        :param end: End of the last window, the last window is cut short if
+            it does not fit.
+        :param bin_seconds: Window size in seconds, e.g. 60 or 3600.
+        :return: Step count per window.
+        """
+        start, end = _to_seconds(start), _to_seconds(end)
+        edges = np.append(np.arange(start, end, bin_seconds), end)
+        return np.diff(self.steps_before(edges))
+
+    def total_steps(self) -> float:
+        """Total number of steps after merging overlapping records.
+
+        :return: Step count.
+        """
+        return float(self.cumulative[-1])
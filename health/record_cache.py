@@ -0,0 +1,206 @@
+"""Record cache.
+
+Stores the parsed quantity records of an Apple Health export as
+memory-mappable NumPy columns, one directory per record type, so that
+unchanged exports do not have to be parsed again. All selected record types
+are read from the export in a single pass when the cache is built.
+
+The cache is keyed by a fingerprint of the export: its size, modification
+time and a hash of its first and last blocks. Hashing only the ends of the
+file keeps the check cheap for multi-gigabyte exports, while still catching
+re-exports that happen to keep the same size and modification time.
+"""
+
+import hashlib
+import json
+import shutil
+from pathlib import Path
+from typing import Collection, Optional
+
+import numpy as np
+from health_export import STEP_COUNT_TYPE, QuantityRecords, read_records
+
+CACHE_VERSION = 3
+HASH_BLOCK_SIZE = 1 << 20
+COLUMNS = ("start", "end", "utc_offset", "local_day", "value", "source")
+
+
+def default_cache_dir(file_path: str) -> Path:
+    """Default cache directory, next to the export.
+
+    :param file_path: File path to health data.
+    :return: Path to the cache directory.
+    """
+    path = Path(file_path)
+    return path.with_name(path.name + ".cache")
+
+
+def export_fingerprint(file_path: str) -> dict[str, int | str]:
+    """Fingerprint an export by its size, modification time and content.
+
+    :param file_path: File path to health data.
+    :return: Dictionary with the fingerprint fields.
+    """
+    stat = Path(file_path).stat()
+    digest = hashlib.blake2b(digest_size=16)
+
+    with open(file_path, "rb") as file:
+        digest.update(file.read(HASH_BLOCK_SIZE))
+        if stat.st_size > HASH_BLOCK_SIZE:
+            file.seek(max(HASH_BLOCK_SIZE, stat.st_size - HASH_BLOCK_SIZE))
+            digest.update(file.read(HASH_BLOCK_SIZE))
+
+    return {
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "hash": digest.hexdigest(),
+    }
+
+
+def _covers(
+    cached_types: Optional[list[str]],
+    record_types: Optional[Collection[str]],
+) -> bool:
+    """Check whether the cached record types include the requested ones.
+
+    :param cached_types: Record types in the cache, `None` for all.
+    :param record_types: Requested record types, `None` for all.
+    :return: `True` if every requested type was cached, otherwise `False`.
+    """
+    if cached_types is None:
+        return True
+    return record_types is not None and set(record_types) <= set(cached_types)
+
+
+def load_records(
+    cache_dir: Path,
+    fingerprint: dict[str, int | str],
+    record_types: Optional[Collection[str]] = None,
+) -> Optional[dict[str, QuantityRecords]]:
+    """Load cached records, if they match the fingerprint.
+
+    :param cache_dir: Path to the cache directory.
+    :param fingerprint: Fingerprint of the export.
+    :param record_types: Record types to load, or `None` for every quantity
+        type.
+    :return: Dictionary with the record types and respective memory-mapped
+        records, or `None` if the cache is stale.
+    """
+    meta_path = cache_dir / "meta.json"
+    if not meta_path.is_file():
+        return None
+
+    meta = json.loads(meta_path.read_text(encoding="utf-8"))
+    if (
+        meta.get("version") != CACHE_VERSION
+        or meta.get("fingerprint") != fingerprint
+        or not _covers(meta["record_types"], record_types)
+    ):
+        return None
+
+    records = {}
+    for record_type, sources in meta["sources"].items():
+        if record_types is not None and record_type not in record_types:
+            continue
+        columns = {
+            name: np.load(cache_dir / record_type / f"{name}.npy", "r")
+            for name in COLUMNS
+        }
+        records[record_type] = QuantityRecords(**columns, sources=sources)
+
+    return records
+
+
+def save_records(
+    records: dict[str, QuantityRecords],
+    cache_dir: Path,
+    fingerprint: dict[str, int | str],
+    record_types: Optional[Collection[str]] = None,
+) -> None:
+    """Save records to the cache.
+
+    The metadata file is written last, so an interrupted write leaves a cache
+    that is treated as stale.
+
+    :param records: Dictionary with the record types and their records.
+    :param cache_dir: Path to the cache directory.
+    :param fingerprint: Fingerprint of the export.
+    :param record_types: Record types that were read from the export, or
+        `None` for every quantity type.
+    """
+    shutil.rmtree(cache_dir, ignore_errors=True)
+    cache_dir.mkdir(parents=True)
+
+    for record_type, type_records in records.items():
+        type_dir = cache_dir / record_type
+        type_dir.mkdir()
+        for name in COLUMNS:
+            np.save(type_dir / f"{name}.npy", getattr(type_records, name))
+
+    meta = {
+        "version": CACHE_VERSION,
+        "fingerprint": fingerprint,
+        "record_types": None if record_types is None else list(record_types),
+        "sources": {
+            record_type: type_records.sources
+            for record_type, type_records in records.items()
+        },
+    }
+    (cache_dir / "meta.json").write_text(json.dumps(meta), encoding="utf-8")
+
+
+def cached_records(
+    file_path: str,
+    record_types: Optional[Collection[str]] = None,
+    cache_dir: Optional[Path] = None,
+    rebuild: bool = False,
+    workers: Optional[int] = None,
+) -> dict[str, QuantityRecords]:
+    """Get the records of an export, parsing it only on a cache miss.
+
+    :param file_path: File path to health data.
+    :param record_types: Record types to get, or `None` for every quantity
+        type.
+    :param cache_dir: Path to the cache directory, next to the export if
+        not given.
+    :param rebuild: Ignore any existing cache and parse the export again.
+    :param workers: Number of worker processes used to parse the export.
+    :return: Dictionary with the record types and respective records.
+    """
+    cache_dir = cache_dir or default_cache_dir(file_path)
+    fingerprint = export_fingerprint(file_path)
+
+    if not rebuild:
+        records = load_records(cache_dir, fingerprint, record_types)
+        if records is not None:
+            return records
+
+    records = read_records(file_path, record_types, workers)
+    save_records(records, cache_dir, fingerprint, record_types)
+    return records
+
+
+def cached_step_records(
+    file_path: str,
+    cache_dir: Optional[Path] = None,
+    rebuild: bool = False,
+    workers: Optional[int] = None,
+    record_types: Optional[Collection[str]] = None,
+) -> QuantityRecords:
+    """Get the step records of an export, parsing it only on a cache miss.
+
+    :param file_path: File path to health data.
+    :param cache_dir: Path to the cache directory, next to the export if
+        not given.
+    :param rebuild: Ignore any existing cache and parse the export again.
+    :param workers: Number of worker processes used to parse the export.
+    :param record_types: Record types to read into the cache alongside the
+        step count, only the step count if not given.
+    :return: Step records.
+    """
+    record_types = {STEP_COUNT_TYPE, *(record_types or ())}
+
+    records = cached_records(
+        file_path, record_types, cache_dir, rebuild, workers
+    )
+    return records.get(STEP_COUNT_TYPE, QuantityRecords.empty())
@@ -3,225 +3,227 @@
 import argparse
 import xml.etree.ElementTree as ET
 from collections import defaultdict
-from datetime import datetime
-from typing import Optional
+from dataclasses import dataclass
+from datetime import date, datetime
+from itertools import chain
+from pathlib import Path
+from typing import Optional, Sequence
+
+from activity_matrix import SLOTS_PER_DAY, activity_matrix
+from daily_series import DailySeries, Streaks
+from downsample import MAX_PLOT_POINTS
+from health_export import (
+    STEP_COUNT_TYPE,
+    QuantityRecords,
+    iter_records,
+    open_export,
+    parallel_daily_steps,
+    read_step_records,
+)
+from interval_index import StepIntervalIndex
+from record_cache import cached_step_records
+from step_store import update_store
+from timestamps import parse_iso_timestamp, record_date
+
+PLOT_METRICS = ("cumulative", "weekday", "distribution")
+OPT_IN_PLOT_METRICS = ("rolling",)
+DEFAULT_STEP_INCREMENT = 500
+
+
+def select_plot_metrics(metrics: Optional[list[str]]) -> list[str]:
+    """Select the daily step plots to draw.
+
+    :param metrics: Requested metrics, or `None` for the default plots.
+    :return: Names of the plots, the opt-in ones only when requested.
+    """
+    if not metrics:
+        return list(PLOT_METRICS)
+    return [
+        metric
+        for metric in (*PLOT_METRICS, *OPT_IN_PLOT_METRICS)
+        if metric in metrics
+    ]
+
 
-import matplotlib.pyplot as plt
-import numpy as np
-from scipy import stats
+def parse_step_thresholds(value: str) -> list[int]:
+    """Parse a step count, or an inclusive ``START:STOP[:STEP]`` range.
+
+    :param value: Step count or range, e.g. ``10000`` or ``1000:30000:500``.
+    :return: List of step counts.
+    :raises ValueError: If the value is not a step count or a non-empty
+        range with a positive step.
+    """
+    bounds = [int(bound) for bound in value.split(":")]
+    if len(bounds) == 1:
+        return bounds
+    if len(bounds) == 2:
+        bounds.append(DEFAULT_STEP_INCREMENT)
+    if len(bounds) != 3 or bounds[2] <= 0 or bounds[0] > bounds[1]:
+        raise ValueError(f"Invalid step count range: {value!r}")
+    start, stop, increment = bounds
+    return list(range(start, stop + 1, increment))
 
 
 def find_longest_streak(
-    daily_steps: dict[datetime, int], steps: int
-) -> tuple[Optional[datetime], int]:
+    daily_steps: DailySeries, steps: int
+) -> tuple[Optional[date], int]:
     """Find the longest streak of steps.
 
     A streak is defined as consecutive days meeting the specified step count.
 
-    :param daily_steps: Dictionary with the dates and respective step count.
+    :param daily_steps: Daily step series.
     :param steps: Number of steps to find the longest streak for.
     :return: Longest streak start date and total number of days.
     """
-    sorted_dates = sorted(daily_steps.keys())
-
-    longest_streak = 0
-    current_streak = 0
-    longest_streak_start_date = None
-    current_streak_start_date = None
-
-    for idx, date in enumerate(sorted_dates):
-        # Check if the steps on the current date meet or exceed the target.
-        if daily_steps[date] >= steps:
-            # Increment the current streak.
-            current_streak += 1
-            # Set the start date of the current streak.
-            if current_streak_start_date is None:
-                current_streak_start_date = date
-        else:
-            # If the current day does not meet the step target, then check if
-            # the current streak is the longest one update the longest streak.
-            if current_streak > longest_streak:
-                longest_streak = current_streak
-                longest_streak_start_date = current_streak_start_date
-            # Reset the current streak variables for the next possible streak.
-            current_streak = 0
-            current_streak_start_date = None
-
-        # Check if the last streak was the longest.
-        if idx == len(sorted_dates) - 1 and current_streak > longest_streak:
-            longest_streak = current_streak
-            longest_streak_start_date = current_streak_start_date
-
-    return longest_streak_start_date, longest_streak
-
-
-def day_with_most_steps(
-    daily_steps: defaultdict[datetime, int]
-) -> tuple[datetime, int]:
-    """Find the day with the most steps.
-
-    :param daily_steps: Dicionary with the dates and respective step count.
-    :return: Day with most steps and respetive step count.
-    """
-    max_daily_steps = max(list(daily_steps.values()))
-    max_daily_steps_idx = list(daily_steps.values()).index(max_daily_steps)
+    return daily_steps.longest_streak(steps)
 
-    return list(daily_steps)[max_daily_steps_idx], max_daily_steps
 
+def find_streaks(
+    daily_steps: DailySeries, thresholds: Sequence[int]
+) -> list[Streaks]:
+    """Find the longest and current streaks for many step counts at once.
 
-def plot_guideline(guideline: int, axis: str):
-    """Overlay a guideline on the current plot.
-
-    :param guideline: Guideline value for number of steps.
-    :param axis: Axis for the guideline ('x' or 'y').
+    :param daily_steps: Daily step series.
+    :param thresholds: Step counts to find the streaks for.
+    :return: Streaks for every step count.
     """
-    if axis == "y":
-        plt.axhline(
-            y=guideline,
-            color="black",
-            linestyle="--",
-            label=f"Guideline: {guideline} steps",
-        )
-    elif axis == "x":
-        plt.axvline(
-            x=guideline,
-            color="black",
-            linestyle="--",
-            label=f"Guideline: {guideline} steps",
-        )
-    else:
-        raise ValueError("Invalid axis argument. Use 'x' or 'y'.")
-
-    plt.legend()
+    return daily_steps.streaks(thresholds)
 
 
-def plot_cumulative_steps(daily_steps: defaultdict[datetime, int]) -> None:
-    """Plot cumulative step count.
+def day_with_most_steps(daily_steps: DailySeries) -> tuple[date, int]:
+    """Find the day with the most steps.
 
-    :param daily_steps: Dictionary with the dates and respective step count.
+    :param daily_steps: Daily step series.
+    :return: Day with most steps and respective step count.
     """
-    dates = []
-    cumulative_steps = []
-    total_steps = 0
-
-    sorted_dates = sorted(list(daily_steps.keys()))
-    for date in sorted_dates:
-        total_steps += daily_steps[date]
-        cumulative_steps.append(total_steps)
-        dates.append(date)
-
-    plt.figure(figsize=(10, 6))
-    plt.plot(dates, cumulative_steps, linestyle="-", color="blue")
-    plt.xlabel("Date")
-    plt.ylabel("Cumulative Step Count")
-    plt.title("Cumulative Daily Step Count")
-    plt.xticks(rotation=45)
-    plt.tight_layout()
-
-
-def plot_average_steps_per_weekday(
-    daily_steps: defaultdict[datetime, int]
-) -> None:
-    """Plot average steps per weekday.
-
-    :param daily_steps: Dictionary with the dates and respective step count.
+    return daily_steps.most_steps()
+
+
+@dataclass
+class LoadOptions:
+    """Options for loading the step data of an export.
+
+    :param stream: Parse the export incrementally with constant memory,
+        without reading or writing the cache.
+    :param cache: Load the parsed records from the on-disk cache, parsing the
+        export only when it has changed.
+    :param rebuild_cache: Parse the export and rebuild the cache, even if it
+        is up to date.
+    :param workers: Number of worker processes used to parse the export.
+    :param store: Path to an incremental store, only the records of the
+        export that are newer than the store are parsed and added to it.
+    :param record_types: Record types read into the cache in the same pass
+        as the step count, only the step count if not given.
     """
-    weekday_steps = defaultdict(list)
-
-    for date, steps in daily_steps.items():
-        weekday = date.weekday()
-        weekday_steps[weekday].append(steps)
-
-    average_steps_per_weekday = {
-        weekday: np.mean(steps) for weekday, steps in weekday_steps.items()
-    }
-
-    weekdays = [
-        "Monday",
-        "Tuesday",
-        "Wednesday",
-        "Thursday",
-        "Friday",
-        "Saturday",
-        "Sunday",
-    ]
-    colors = ["red", "orange", "yellow", "green", "blue", "indigo", "violet"]
 
-    average_steps = [average_steps_per_weekday[i] for i in range(7)]
+    stream: bool = False
+    cache: bool = False
+    rebuild_cache: bool = False
+    workers: Optional[int] = None
+    store: Optional[Path] = None
+    record_types: Optional[list[str]] = None
 
-    plt.figure(figsize=(10, 6))
-    plt.bar(weekdays, average_steps, color=colors)
-    plt.xlabel("Day of the Week")
-    plt.ylabel("Average Steps")
-    plt.title("Average Steps per Weekday")
-    plt.tight_layout()
 
+def load_step_records(
+    file_path: str, options: Optional[LoadOptions] = None
+) -> QuantityRecords:
+    """Load the step records of an export.
 
-def plot_daily_step_distribution(
-    daily_steps: defaultdict[datetime, int]
-) -> None:
-    """Plot daily step count distribution.
-
-    :param daily_steps: Dictionary with the dates and respective step count.
+    :param file_path: File path to health data.
+    :param options: Options for loading the data.
+    :return: Columnar step records.
     """
-    daily_step_totals = list(daily_steps.values())
-
-    mean_daily_steps = np.mean(daily_step_totals)
-    std_dev_daily_steps = np.std(daily_step_totals)
-
-    min_daily_steps = min(daily_step_totals)
-    max_daily_steps = max(daily_step_totals)
-
-    # pylint: disable=invalid-name
-    x = np.linspace(min_daily_steps, max_daily_steps, 100)
-    y = stats.norm.pdf(x, mean_daily_steps, std_dev_daily_steps)
+    options = options or LoadOptions()
+
+    if (options.cache or options.rebuild_cache) and not options.stream:
+        return cached_step_records(
+            file_path,
+            rebuild=options.rebuild_cache,
+            workers=options.workers,
+            record_types=options.record_types,
+        )
 
-    plt.figure(figsize=(10, 6))
-    plt.plot(x, y, "b-", linewidth=2)
-    plt.title("Daily Step Count Distribution")
-    plt.xlabel("Daily Step Count")
-    plt.ylabel("Probability Density")
-    plt.grid(True)
-    plt.xlim(min_daily_steps, max_daily_steps)
+    return read_step_records(file_path, options.workers)
 
 
-def load_data(file_path: str) -> defaultdict[datetime, int]:
+def load_data(
+    file_path: str, options: Optional[LoadOptions] = None
+) -> DailySeries:
     """Load data.
 
     :param file_path: File path to health data.
-    :return: Dictionary with the dates and respective step count.
+    :param options: Options for loading the data.
+    :return: Daily step series.
     """
-    tree = ET.parse(file_path)
-    root = tree.getroot()
+    options = options or LoadOptions()
+
+    if options.store is not None:
+        return update_store(file_path, options.store, options.workers)
+
+    if (options.cache or options.rebuild_cache) and not options.stream:
+        return DailySeries.from_records(load_step_records(file_path, options))
+
+    if options.workers:
+        return DailySeries.from_dict(
+            parallel_daily_steps(file_path, options.workers)
+        )
+
+    if options.stream:
+        records = iter_records(file_path)
+    else:
+        with open_export(file_path) as file:
+            root = ET.parse(file).getroot()
+        records = root.findall(f".//Record[@type='{STEP_COUNT_TYPE}']")
 
     daily_steps = defaultdict(int)
 
-    records = root.findall(
-        ".//Record[@type='HKQuantityTypeIdentifierStepCount']"
-    )
     for record in records:
         start_date = record.get("startDate")
         value = int(record.get("value"))
-        date_obj = datetime.strptime(start_date, "%Y-%m-%d %H:%M:%S %z").date()
+        date_obj = record_date(start_date)
         daily_steps[date_obj] += value
 
-    return daily_steps
+    return DailySeries.from_dict(daily_steps)
 
 
 def main(
     file_path: str,
     metrics: list[str],
-    steps: Optional[int],
+    steps: Optional[list[int]],
     guideline: Optional[int],
+    options: Optional[LoadOptions] = None,
+    time_range: Optional[tuple[datetime, datetime]] = None,
+    source_priority: Optional[list[str]] = None,
+    max_points: int = MAX_PLOT_POINTS,
+    heatmap_slots: int = 24,
 ) -> None:
     """Main function.
 
     :param file_path: File path to health data.
     :param metrics: Optional parameter for metrics to display.
-    :param steps: Optional parameter for calculating the longest streak.
+    :param steps: Optional parameter for calculating the longest and current
+        streaks, one or more step counts.
     :param guideline: Optional parameter for inserting guideline.
+    :param options: Optional parameter for loading the data.
+    :param time_range: Optional parameter for counting the steps in a time
+        window of timezone-aware timestamps, with overlapping records merged.
+    :param source_priority: Optional parameter for the order in which
+        overlapping sources are preferred.
+    :param max_points: Optional parameter for the maximum number of points
+        per plot, longer series are downsampled.
+    :param heatmap_slots: Optional parameter for the number of time slots
+        per day of the heatmap, 24 or 96.
     """
-    daily_steps = load_data(file_path)
+    # The heatmap and the time range need the records themselves, so they
+    # are loaded once and the daily series is derived from them.
+    records = None
+    if (time_range is not None or (metrics and "heatmap" in metrics)) and (
+        options is None or options.store is None
+    ):
+        records = load_step_records(file_path, options)
+        daily_steps = DailySeries.from_records(records)
+    else:
+        daily_steps = load_data(file_path, options)
 
     most_steps_date, most_steps_count = day_with_most_steps(daily_steps)
     print(
@@ -232,50 +234,88 @@ def main(
         )
     )
 
-    if not metrics or "cumulative" in metrics:
-        plot_cumulative_steps(daily_steps)
-        plt.show()
-
-    if not metrics or "weekday" in metrics:
-        plot_average_steps_per_weekday(daily_steps)
-        if guideline is not None:
-            plot_guideline(guideline, "y")
-        plt.show()
-
-    if not metrics or "distribution" in metrics:
-        plot_daily_step_distribution(daily_steps)
-        if guideline is not None:
-            plot_guideline(guideline, "x")
+    plot_metrics = select_plot_metrics(metrics)
+    if plot_metrics:
+        # Plotting libraries are slow to import, so only load them when a
+        # plot is requested.
+        # pylint: disable=import-outside-toplevel
+        import matplotlib.pyplot as plt
+        from step_plots import plot_metric
+
+        for metric in plot_metrics:
+            plot_metric(metric, daily_steps, guideline, max_points)
+            plt.show()
+
+    if metrics and "heatmap" in metrics:
+        # pylint: disable=import-outside-toplevel
+        import matplotlib.pyplot as plt
+        from step_plots import plot_activity_heatmap
+
+        if records is None:
+            records = load_step_records(file_path, options)
+        plot_activity_heatmap(activity_matrix(records, heatmap_slots))
         plt.show()
 
-    if (not metrics or "streak" in metrics) and steps is not None:
-        longest_streak_start, longest_streak_length = find_longest_streak(
-            daily_steps, steps
-        )
-        print(
-            (
-                f"The longest streak of at least {steps} steps is "
-                f"{longest_streak_length} days, starting on "
-                f"{longest_streak_start}."
+    if (not metrics or "streak" in metrics) and steps:
+        streaks = find_streaks(daily_steps, steps)
+        if len(streaks) == 1:
+            streak = streaks[0]
+            print(
+                (
+                    f"The longest streak of at least {streak.steps} steps is "
+                    f"{streak.longest_days} days, starting on "
+                    f"{streak.longest_start}."
+                )
             )
-        )
+            print(
+                (
+                    f"The current streak of at least {streak.steps} steps is "
+                    f"{streak.current_days} days, starting on "
+                    f"{streak.current_start}."
+                )
+            )
+        else:
+            print(
+                f"{'steps':>8}{'longest':>10}{'since':>12}"
+                f"{'current':>10}{'since':>12}"
+            )
+            for streak in streaks:
+                print(
+                    f"{streak.steps:>8}{streak.longest_days:>10}"
+                    f"{str(streak.longest_start or '-'):>12}"
+                    f"{streak.current_days:>10}"
+                    f"{str(streak.current_start or '-'):>12}"
+                )
     elif not metrics or "streak" in metrics:
         raise ValueError(
             "When using the 'streak' metric, you must also specify --steps"
         )
 
+    if time_range is not None:
+        if records is None:
+            records = load_step_records(file_path, options)
+        index = StepIntervalIndex.from_records(records, source_priority)
+        range_start, range_end = time_range
+        range_steps = index.steps_between(range_start, range_end)
+        print(
+            (
+                f"Between {range_start} and {range_end} there are "
+                f"{range_steps:.0f} steps, with overlapping sources merged."
+            )
+        )
+
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(
         description="Analyze health data for step count metrics."
     )
 
-    FILE_PATH_HELP = "The file path to the export.xml file"
+    FILE_PATH_HELP = "The file path to the export.xml or export.zip file"
     parser.add_argument("file_path", type=str, help=FILE_PATH_HELP)
 
     METRICS_HELP = (
         "Specify one or more health metrics: cumulative, weekday, "
-        "distribution, streak"
+        "distribution, streak, rolling and heatmap (only when requested)"
     )
     parser.add_argument(
         "-m",
@@ -285,13 +325,15 @@ if __name__ == "__main__":
     )
 
     STEPS_HELP = (
-        "Specify the minimum number of steps for calculating the longest "
-        "streak"
+        "Specify the minimum number of steps for calculating the longest and "
+        "current streaks, as one or more step counts or START:STOP[:STEP] "
+        "ranges, e.g. 1000:30000:500"
     )
     parser.add_argument(
         "-s",
         "--steps",
-        type=int,
+        nargs="+",
+        type=parse_step_thresholds,
         help=STEPS_HELP,
     )
 
@@ -303,5 +345,96 @@ if __name__ == "__main__":
         help=GUIDELINE_HELP,
     )
 
+    STREAM_HELP = (
+        "Parse the export incrementally, keeping memory usage independent of "
+        "the file size, without reading or writing the cache"
+    )
+    parser.add_argument("--stream", action="store_true", help=STREAM_HELP)
+
+    NO_CACHE_HELP = "Do not read or write the cache of parsed records"
+    parser.add_argument("--no-cache", action="store_true", help=NO_CACHE_HELP)
+
+    REBUILD_CACHE_HELP = "Parse the export and rebuild the cache of records"
+    parser.add_argument(
+        "--rebuild-cache", action="store_true", help=REBUILD_CACHE_HELP
+    )
+
+    WORKERS_HELP = "Number of worker processes used to parse the export"
+    parser.add_argument("-w", "--workers", type=int, help=WORKERS_HELP)
+
+    STORE_HELP = (
+        "Path to a store of already ingested daily totals, only records newer "
+        "than the store are read from an export.xml and added to it"
+    )
+    parser.add_argument("--store", type=Path, help=STORE_HELP)
+
+    TYPES_HELP = (
+        "Quantity record types to read into the cache in the same pass as the "
+        "step count, only the step count by default"
+    )
+    parser.add_argument("--types", nargs="+", help=TYPES_HELP)
+
+    RANGE_HELP = (
+        "Count the steps between two ISO 8601 timestamps with UTC offsets, "
+        "e.g. 2024-01-01T00:00:00+01:00, merging records of overlapping "
+        "sources"
+    )
+    parser.add_argument(
+        "--range",
+        nargs=2,
+        type=parse_iso_timestamp,
+        metavar=("START", "END"),
+        help=RANGE_HELP,
+    )
+
+    SOURCE_PRIORITY_HELP = (
+        "Source names in order of preference when records overlap"
+    )
+    parser.add_argument(
+        "--source-priority", nargs="+", help=SOURCE_PRIORITY_HELP
+    )
+
+    MAX_POINTS_HELP = (
+        "Maximum number of points per plot, longer series are downsampled"
+    )
+    parser.add_argument(
+        "--max-points",
+        type=int,
+        default=MAX_PLOT_POINTS,
+        help=MAX_POINTS_HELP,
+    )
+
+    HEATMAP_SLOTS_HELP = (
+        "Number of time slots per day of the heatmap, 24 for hours or 96 for "
+        "quarter-hours"
+    )
+    parser.add_argument(
+        "--heatmap-slots",
+        type=int,
+        choices=SLOTS_PER_DAY,
+        default=24,
+        help=HEATMAP_SLOTS_HELP,
+    )
+
     args = parser.parse_args()
-    main(args.file_path, args.metrics, args.steps, args.guideline)
+    if args.stream and args.rebuild_cache:
+        parser.error("--stream cannot be combined with --rebuild-cache")
+    load_options = LoadOptions(
+        stream=args.stream,
+        cache=not args.no_cache,
+        rebuild_cache=args.rebuild_cache,
+        workers=args.workers,
+        store=args.store,
+        record_types=args.types,
+    )
+    main(
+        args.file_path,
+        args.metrics,
+        list(chain.from_iterable(args.steps or [])),
+        args.guideline,
+        load_options,
+        args.range,
+        args.source_priority,
+        args.max_points,
+        args.heatmap_slots,
+    )
@@ -0,0 +1,212 @@
+"""Step count plots.
+
+Plotting helpers for the step count metrics. Kept apart from the metrics so
+that matplotlib and SciPy are only imported when a plot is rendered.
+"""
+
+from typing import Optional
+
+import matplotlib.pyplot as plt
+import numpy as np
+from daily_series import ROLLING_WINDOWS, DailySeries
+from downsample import MAX_PLOT_POINTS, downsample, lttb_indices
+from scipy import stats
+
+WEEKDAYS = [
+    "Monday",
+    "Tuesday",
+    "Wednesday",
+    "Thursday",
+    "Friday",
+    "Saturday",
+    "Sunday",
+]
+
+
+def plot_guideline(guideline: int, axis: str):
+    """Overlay a guideline on the current plot.
+
+    :param guideline: Guideline value for number of steps.
+    :param axis: Axis for the guideline ('x' or 'y').
+    """
+    if axis == "y":
+        plt.axhline(
+            y=guideline,
+            color="black",
+            linestyle="--",
+            label=f"Guideline: {guideline} steps",
+        )
+    elif axis == "x":
+        plt.axvline(
+            x=guideline,
+            color="black",
+            linestyle="--",
+            label=f"Guideline: {guideline} steps",
+        )
+    else:
+        raise ValueError("Invalid axis argument. Use 'x' or 'y'.")
+
+    plt.legend()
+
+
+def plot_cumulative_steps(
+    daily_steps: DailySeries, max_points: int = MAX_PLOT_POINTS
+) -> None:
+    """Plot cumulative step count.
+
+    :param daily_steps: Daily step series.
+    :param max_points: Maximum number of points to plot, longer series are
+        downsampled.
+    """
+    dates, cumulative_steps = downsample(
+        daily_steps.dates(), daily_steps.cumulative(), max_points
+    )
+
+    plt.figure(figsize=(10, 6))
+    plt.plot(dates, cumulative_steps, linestyle="-", color="blue")
+    plt.xlabel("Date")
+    plt.ylabel("Cumulative Step Count")
+    plt.title("Cumulative Daily Step Count")
+    plt.xticks(rotation=45)
+    plt.tight_layout()
+
+
+def plot_average_steps_per_weekday(daily_steps: DailySeries) -> None:
+    """Plot average steps per weekday.
+
+    :param daily_steps: Daily step series.
+    """
+    average_steps = daily_steps.weekday_means()
+
+    colors = ["red", "orange", "yellow", "green", "blue", "indigo", "violet"]
+
+    plt.figure(figsize=(10, 6))
+    plt.bar(WEEKDAYS, average_steps, color=colors)
+    plt.xlabel("Day of the Week")
+    plt.ylabel("Average Steps")
+    plt.title("Average Steps per Weekday")
+    plt.tight_layout()
+
+
+def plot_daily_step_distribution(daily_steps: DailySeries) -> None:
+    """Plot daily step count distribution.
+
+    :param daily_steps: Daily step series.
+    """
+    (
+        mean_daily_steps,
+        std_dev_daily_steps,
+        min_daily_steps,
+        max_daily_steps,
+    ) = daily_steps.distribution()
+
+    # pylint: disable=invalid-name
+    x = np.linspace(min_daily_steps, max_daily_steps, 100)
+    y = stats.norm.pdf(x, mean_daily_steps, std_dev_daily_steps)
+
+    plt.figure(figsize=(10, 6))
+    plt.plot(x, y, "b-", linewidth=2)
+    plt.title("Daily Step Count Distribution")
+    plt.xlabel("Daily Step Count")
+    plt.ylabel("Probability Density")
+    plt.grid(True)
+    plt.xlim(min_daily_steps, max_daily_steps)
+
+
+def plot_rolling_steps(
+    daily_steps: DailySeries, max_points: int = MAX_PLOT_POINTS
+) -> None:
+    """Plot rolling average steps, with a band of one standard deviation.
+
+    :param daily_steps: Daily step series.
+    :param max_points: Maximum number of points to plot per line, longer
+        series are downsampled.
+    """
+    dates = daily_steps.dates()
+    lines = {}
+    for window in ROLLING_WINDOWS:
+        rolling = daily_steps.rolling(window)
+        defined = np.flatnonzero(np.isfinite(rolling.mean))
+        shown = defined[
+            lttb_indices(defined, rolling.mean[defined], max_points)
+        ]
+        lines[window] = (
+            dates[shown],
+            rolling.mean[shown],
+            rolling.std[shown],
+        )
+
+    plt.figure(figsize=(10, 6))
+    for window, (line_dates, mean, _) in lines.items():
+        plt.plot(line_dates, mean, label=f"{window}-day mean")
+
+    # Band of the longest window, on the points of its line.
+    band_window = max(ROLLING_WINDOWS)
+    band_dates, band_mean, band_std = lines[band_window]
+    plt.fill_between(
+        band_dates,
+        band_mean - band_std,
+        band_mean + band_std,
+        alpha=0.2,
+        label=f"{band_window}-day standard deviation",
+    )
+    plt.xlabel("Date")
+    plt.ylabel("Steps")
+    plt.title("Rolling Average Steps")
+    plt.xticks(rotation=45)
+    plt.legend()
+    plt.tight_layout()
+
+
+def plot_activity_heatmap(matrix: np.ndarray) -> None:
+    """Plot average steps per weekday and time of day.
+
+    :param matrix: Activity matrix of shape (7, slots per day).
+    """
+    slots_per_day = matrix.shape[1]
+    slots_per_hour = slots_per_day // 24
+
+    plt.figure(figsize=(12, 5))
+    plt.imshow(matrix, aspect="auto", cmap="viridis", interpolation="nearest")
+    plt.colorbar(label="Average Steps")
+    plt.yticks(range(7), WEEKDAYS)
+    plt.xticks(
+        np.arange(0, slots_per_day, 3 * slots_per_hour) - 0.5,
+        [f"{hour:02d}:00" for hour in range(0, 24, 3)],
+    )
+    plt.xlabel("Time of Day")
+    plt.title("Average Steps per Weekday and Time of Day")
+    plt.tight_layout()
+
+
+# Plot function, guideline axis and whether the plot takes a point budget.
+PLOTS = {
+    "cumulative": (plot_cumulative_steps, None, True),
+    "weekday": (plot_average_steps_per_weekday, "y", False),
+    "distribution": (plot_daily_step_distribution, "x", False),
+    "rolling": (plot_rolling_steps, "y", True),
+}
+
+
+def plot_metric(
+    metric: str,
+    daily_steps: DailySeries,
+    guideline: Optional[int] = None,
+    max_points: int = MAX_PLOT_POINTS,
+) -> None:
+    """Plot a step count metric, with an optional guideline.
+
+    :param metric: Name of the metric: cumulative, weekday, distribution or
+        rolling.
+    :param daily_steps: Daily step series.
+    :param guideline: Guideline value for number of steps.
+    :param max_points: Maximum number of points to plot, longer series are
+        downsampled.
+    """
+    plot, guideline_axis, downsampled = PLOTS[metric]
+    if downsampled:
+        plot(daily_steps, max_points)
+    else:
+        plot(daily_steps)
+    if guideline is not None and guideline_axis is not None:
+        plot_guideline(guideline, guideline_axis)
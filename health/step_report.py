@@ -0,0 +1,268 @@
+"""Step count batch report.
+
+Renders the step count metrics of many users' Apple Health exports to image
+files, without a display. Every export in the input directory is processed
+in its own worker process, and a ``summary.json`` with the computed metrics
+is written next to the images of each user.
+
+Usage:
+    python health/step_report.py exports/ reports/ -m weekday streak -s 10000
+
+where ``exports/`` holds either one ``export.xml`` or ``export.zip`` per user
+subdirectory, or one XML or zip file per user.
+"""
+
+import argparse
+import json
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from itertools import chain
+from pathlib import Path
+from typing import Any, Optional
+
+from downsample import MAX_PLOT_POINTS
+from step_count import (
+    LoadOptions,
+    day_with_most_steps,
+    find_streaks,
+    load_data,
+    parse_step_thresholds,
+    select_plot_metrics,
+)
+
+
+def find_exports(input_dir: Path) -> dict[str, Path]:
+    """Find the exports of all users in a directory.
+
+    :param input_dir: Directory with one export per user.
+    :return: Dictionary with the user names and respective export paths,
+        the XML export if a user has both an XML and a zip export.
+    """
+    exports = {}
+    for pattern in ("*/export.zip", "*/export.xml"):
+        for file_path in sorted(input_dir.glob(pattern)):
+            exports[file_path.parent.name] = file_path
+    for pattern in ("*.zip", "*.xml"):
+        for file_path in sorted(input_dir.glob(pattern)):
+            exports[file_path.stem] = file_path
+
+    return exports
+
+
+def render_report(
+    file_path: Path,
+    output_dir: Path,
+    metrics: Optional[list[str]] = None,
+    steps: Optional[list[int]] = None,
+    guideline: Optional[int] = None,
+    image_format: str = "png",
+    options: Optional[LoadOptions] = None,
+    max_points: int = MAX_PLOT_POINTS,
+) -> dict[str, Any]:
+    """Compute the step metrics of an export and render its plots to files.
+
+    :param file_path: File path to health data.
+    :param output_dir: Directory to write the images and summary to.
+    :param metrics: Metrics to compute, the default ones if not given.
+    :param steps: Minimum numbers of steps for the longest and current
+        streaks.
+    :param guideline: Guideline for the number of steps per day.
+    :param image_format: Image file format, e.g. png or svg.
+    :param options: Options for loading the data.
+    :param max_points: Maximum number of points per plot, longer series are
+        downsampled.
+    :return: Dictionary with the computed metrics.
+    """
+    daily_steps = load_data(str(file_path), options)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    most_steps_date, most_steps_count = day_with_most_steps(daily_steps)
+    summary = {
+        "export": str(file_path),
+        "most_steps": {
+            "date": most_steps_date.isoformat(),
+            "steps": most_steps_count,
+        },
+    }
+
+    if (not metrics or "streak" in metrics) and steps:
+        summary["streaks"] = [
+            {
+                "steps": streak.steps,
+                "longest": {
+                    "start": (
+                        streak.longest_start.isoformat()
+                        if streak.longest_start
+                        else None
+                    ),
+                    "days": streak.longest_days,
+                },
+                "current": {
+                    "start": (
+                        streak.current_start.isoformat()
+                        if streak.current_start
+                        else None
+                    ),
+                    "days": streak.current_days,
+                },
+            }
+            for streak in find_streaks(daily_steps, steps)
+        ]
+
+    plot_metrics = select_plot_metrics(metrics)
+    if plot_metrics:
+        # Select the non-interactive backend before pyplot is first imported,
+        # and only pay for the plotting imports when a plot is requested.
+        # pylint: disable=import-outside-toplevel
+        import matplotlib
+
+        matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
+        from step_plots import plot_metric
+
+        summary["images"] = []
+        for metric in plot_metrics:
+            plot_metric(metric, daily_steps, guideline, max_points)
+            image_path = output_dir / f"{metric}.{image_format}"
+            plt.savefig(image_path)
+            plt.close("all")
+            summary["images"].append(image_path.name)
+
+    summary_path = output_dir / "summary.json"
+    summary_path.write_text(json.dumps(summary, indent=2), encoding="utf-8")
+
+    return summary
+
+
+def batch_report(
+    input_dir: Path,
+    output_dir: Path,
+    metrics: Optional[list[str]] = None,
+    steps: Optional[list[int]] = None,
+    guideline: Optional[int] = None,
+    image_format: str = "png",
+    workers: Optional[int] = None,
+    options: Optional[LoadOptions] = None,
+    max_points: int = MAX_PLOT_POINTS,
+) -> dict[str, dict[str, Any]]:
+    """Render the reports of all exports in a directory with a process pool.
+
+    A failing export is reported and skipped, so that it does not stop the
+    reports of the other users.
+
+    :param input_dir: Directory with one export per user.
+    :param output_dir: Directory to write one report subdirectory per user.
+    :param metrics: Metrics to compute, the default ones if not given.
+    :param steps: Minimum numbers of steps for the longest and current
+        streaks.
+    :param guideline: Guideline for the number of steps per day.
+    :param image_format: Image file format, e.g. png or svg.
+    :param workers: Number of worker processes, one per CPU if not given.
+    :param options: Options for loading the data.
+    :param max_points: Maximum number of points per plot, longer series are
+        downsampled.
+    :return: Dictionary with the user names and respective metrics.
+    """
+    exports = find_exports(input_dir)
+    summaries = {}
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(
+                render_report,
+                file_path,
+                output_dir / user,
+                metrics,
+                steps,
+                guideline,
+                image_format,
+                options,
+                max_points,
+            ): user
+            for user, file_path in exports.items()
+        }
+        for future in as_completed(futures):
+            user = futures[future]
+            try:
+                summaries[user] = future.result()
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                print(f"Error creating the report for {user}: {e}")
+                continue
+            print(f"Report for {user} written to {output_dir / user}")
+
+    return summaries
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=(
+            "Render step count reports for a directory of health data exports "
+            "without a display."
+        )
+    )
+    parser.add_argument(
+        "input_dir", type=Path, help="Directory with one export per user"
+    )
+    parser.add_argument(
+        "output_dir", type=Path, help="Directory to write the reports to"
+    )
+    parser.add_argument(
+        "-m",
+        "--metrics",
+        nargs="+",
+        help=(
+            "Specify one or more health metrics: cumulative, weekday, "
+            "distribution, streak, rolling (only when requested)"
+        ),
+    )
+    parser.add_argument(
+        "-s",
+        "--steps",
+        nargs="+",
+        type=parse_step_thresholds,
+        help=(
+            "Minimum number of steps for calculating the longest and current "
+            "streaks, as one or more step counts or START:STOP[:STEP] ranges"
+        ),
+    )
+    parser.add_argument(
+        "-g",
+        "--guideline",
+        type=int,
+        help="Guideline for the number of steps per day",
+    )
+    parser.add_argument(
+        "-f", "--format", default="png", help="Image file format"
+    )
+    parser.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        help="Number of exports processed in parallel",
+    )
+    parser.add_argument(
+        "--max-points",
+        type=int,
+        default=MAX_PLOT_POINTS,
+        help=(
+            "Maximum number of points per plot, longer series are "
+            "downsampled"
+        ),
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Do not read or write the cache of parsed records",
+    )
+
+    args = parser.parse_args()
+    batch_report(
+        args.input_dir,
+        args.output_dir,
+        args.metrics,
+        list(chain.from_iterable(args.steps or [])),
+        args.guideline,
+        args.format,
+        args.workers,
+        LoadOptions(cache=not args.no_cache),
+        args.max_points,
+    )
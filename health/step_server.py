@@ -0,0 +1,369 @@
+"""Step count query server.
+
+Loads an Apple Health export once and keeps the daily step series and the
+step interval index in memory, answering metric queries over HTTP without
+reparsing the export. Queries are answered concurrently on an asyncio event
+loop, while the export is watched for changes and reloaded in a worker
+thread, so queries keep being answered from the previous data until the new
+data is swapped in.
+
+Usage:
+    python health/step_server.py export.xml --port 8000
+
+Endpoints, all answering with JSON:
+    /most-steps
+    /streaks?steps=10000&steps=1000:30000:500
+    /weekday
+    /distribution
+    /range?start=2024-01-01T00:00:00+01:00&end=2024-01-02T00:00:00+01:00
+
+A ``+`` in a query is read literally, not as a space, so that UTC offsets
+need no escaping. Range timestamps must have a UTC offset.
+"""
+
+import argparse
+import asyncio
+import calendar
+import json
+import math
+import os
+from dataclasses import dataclass
+from http import HTTPStatus
+from itertools import chain
+from pathlib import Path
+from typing import Any, Callable, Optional
+from urllib.parse import parse_qs, urlsplit
+
+from daily_series import DailySeries
+from interval_index import StepIntervalIndex
+from step_count import LoadOptions, load_step_records, parse_step_thresholds
+from timestamps import parse_iso_timestamp
+
+POLL_INTERVAL = 2.0
+MAX_HEADER_LINES = 100
+
+
+@dataclass
+class StepMetrics:
+    """Step aggregates of an export, computed once per load."""
+
+    daily_steps: DailySeries
+    index: StepIntervalIndex
+    most_steps: dict[str, Any]
+    weekday_means: dict[str, Optional[float]]
+    distribution: dict[str, float]
+
+    @classmethod
+    def load(
+        cls,
+        file_path: str,
+        options: Optional[LoadOptions] = None,
+        source_priority: Optional[list[str]] = None,
+    ) -> "StepMetrics":
+        """Load an export and compute its aggregates.
+
+        :param file_path: File path to health data.
+        :param options: Options for loading the data.
+        :param source_priority: Order in which overlapping sources are
+            preferred.
+        :return: Step aggregates.
+        """
+        records = load_step_records(file_path, options)
+        daily_steps = DailySeries.from_records(records)
+        index = StepIntervalIndex.from_records(records, source_priority)
+
+        most_steps = {}
+        if daily_steps.recorded.any():
+            most_steps_date, most_steps_count = daily_steps.most_steps()
+            most_steps = {
+                "date": most_steps_date.isoformat(),
+                "steps": most_steps_count,
+            }
+
+        distribution = {}
+        if daily_steps.recorded.any():
+            mean, std, minimum, maximum = daily_steps.distribution()
+            distribution = {
+                "mean": mean,
+                "std": std,
+                "min": minimum,
+                "max": maximum,
+            }
+
+        weekday_means = {
+            day: None if math.isnan(mean) else float(mean)
+            for day, mean in zip(
+                calendar.day_name, daily_steps.weekday_means()
+            )
+        }
+
+        return cls(daily_steps, index, most_steps, weekday_means, distribution)
+
+    def streaks(self, query: dict[str, list[str]]) -> list[dict[str, Any]]:
+        """Longest and current streaks for the requested step counts.
+
+        :param query: Query parameters, with one or more ``steps``.
+        :return: Streaks for every step count.
+        """
+        if "steps" not in query:
+            raise ValueError("The 'steps' parameter is required.")
+        thresholds = list(
+            chain.from_iterable(map(parse_step_thresholds, query["steps"]))
+        )
+        return [
+            {
+                "steps": streak.steps,
+                "longest": {
+                    "start": _isoformat(streak.longest_start),
+                    "days": streak.longest_days,
+                },
+                "current": {
+                    "start": _isoformat(streak.current_start),
+                    "days": streak.current_days,
+                },
+            }
+            for streak in self.daily_steps.streaks(thresholds)
+        ]
+
+    def range_steps(self, query: dict[str, list[str]]) -> dict[str, Any]:
+        """Steps between two ISO 8601 timestamps, with sources merged.
+
+        :param query: Query parameters, with ``start`` and ``end``.
+        :return: Time window and its step count.
+        """
+        if "start" not in query or "end" not in query:
+            raise ValueError("The 'start' and 'end' parameters are required.")
+        start = parse_iso_timestamp(query["start"][0])
+        end = parse_iso_timestamp(query["end"][0])
+        return {
+            "start": start.isoformat(),
+            "end": end.isoformat(),
+            "steps": float(self.index.steps_between(start, end)),
+        }
+
+
+def _isoformat(value: Any) -> Optional[str]:
+    """Format an optional date.
+
+    :param value: Date or None.
+    :return: ISO 8601 date or None.
+    """
+    return value.isoformat() if value else None
+
+
+def _file_version(file_path: str) -> tuple[int, int]:
+    """Version of a file, changing whenever the file is rewritten.
+
+    :param file_path: File path.
+    :return: Modification time in nanoseconds and size.
+    """
+    stat = os.stat(file_path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+class StepServer:
+    """HTTP server answering step metric queries from memory."""
+
+    def __init__(
+        self,
+        file_path: str,
+        options: Optional[LoadOptions] = None,
+        source_priority: Optional[list[str]] = None,
+        poll_interval: float = POLL_INTERVAL,
+    ) -> None:
+        """Initialize the server.
+
+        :param file_path: File path to health data.
+        :param options: Options for loading the data.
+        :param source_priority: Order in which overlapping sources are
+            preferred.
+        :param poll_interval: Seconds between checks for a changed export.
+        """
+        self.file_path = file_path
+        self.options = options
+        self.source_priority = source_priority
+        self.poll_interval = poll_interval
+        self.version = _file_version(file_path)
+        self.metrics = StepMetrics.load(file_path, options, source_priority)
+        self.routes: dict[str, Callable[[dict[str, list[str]]], Any]] = {
+            "/most-steps": lambda query: self.metrics.most_steps,
+            "/streaks": lambda query: self.metrics.streaks(query),
+            "/weekday": lambda query: self.metrics.weekday_means,
+            "/distribution": lambda query: self.metrics.distribution,
+            "/range": lambda query: self.metrics.range_steps(query),
+        }
+
+    async def watch(self) -> None:
+        """Reload the export whenever it changes.
+
+        The export is loaded in a worker thread and swapped in once loaded,
+        so that queries are not blocked by the reload.
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                version = _file_version(self.file_path)
+                if version == self.version:
+                    continue
+                metrics = await loop.run_in_executor(
+                    None,
+                    StepMetrics.load,
+                    self.file_path,
+                    self.options,
+                    self.source_priority,
+                )
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                # The export may be in the middle of being rewritten, so
+                # keep the previous data and retry on the next change check.
+                print(f"Error reloading {self.file_path}: {e}")
+                continue
+            self.metrics, self.version = metrics, version
+            print(f"Reloaded {self.file_path}")
+
+    def answer(self, target: str) -> tuple[HTTPStatus, Any]:
+        """Answer a query.
+
+        :param target: Request target, a path with optional query string.
+        :return: Response status and JSON-serialisable body.
+        """
+        url = urlsplit(target)
+        route = self.routes.get(url.path)
+        if route is None:
+            return HTTPStatus.NOT_FOUND, {"error": f"Unknown path {url.path}"}
+        try:
+            # Escaped so that parse_qs keeps the + of UTC offsets.
+            query = parse_qs(url.query.replace("+", "%2B"))
+            return HTTPStatus.OK, route(query)
+        except ValueError as e:
+            return HTTPStatus.BAD_REQUEST, {"error": str(e)}
+
+    async def handle(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        """Answer the requests of a connection, keeping it alive.
+
+        :param reader: Stream to read the requests from.
+        :param writer: Stream to write the responses to.
+        """
+        try:
+            while request_line := await reader.readline():
+                headers = {}
+                for _ in range(MAX_HEADER_LINES):
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip().lower()
+
+                parts = request_line.decode("latin-1").split()
+                if len(parts) != 3:
+                    status, body = HTTPStatus.BAD_REQUEST, {
+                        "error": "Malformed request line"
+                    }
+                elif parts[0] != "GET":
+                    status, body = HTTPStatus.METHOD_NOT_ALLOWED, {
+                        "error": "Only GET requests are supported"
+                    }
+                else:
+                    status, body = self.answer(parts[1])
+
+                keep_alive = headers.get("connection") != "close"
+                connection = "keep-alive" if keep_alive else "close"
+                content = json.dumps(body).encode()
+                writer.write(
+                    (
+                        f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+                        "Content-Type: application/json\r\n"
+                        f"Content-Length: {len(content)}\r\n"
+                        f"Connection: {connection}\r\n\r\n"
+                    ).encode()
+                    + content
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def serve(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 8000,
+        socket_path: Optional[Path] = None,
+    ) -> None:
+        """Serve queries until cancelled.
+
+        :param host: Host to listen on.
+        :param port: Port to listen on.
+        :param socket_path: Unix socket to listen on instead of a port.
+        """
+        if socket_path is not None:
+            server = await asyncio.start_unix_server(
+                self.handle, path=socket_path
+            )
+        else:
+            server = await asyncio.start_server(self.handle, host, port)
+
+        address = socket_path or f"http://{host}:{port}"
+        print(f"Serving step metrics of {self.file_path} on {address}")
+        watcher = asyncio.create_task(self.watch())
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            watcher.cancel()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Serve step count metrics of a health data export."
+    )
+    parser.add_argument(
+        "file_path", type=str, help="The file path to the export.xml file"
+    )
+    parser.add_argument(
+        "--host", default="127.0.0.1", help="Host to listen on"
+    )
+    parser.add_argument(
+        "-p", "--port", type=int, default=8000, help="Port to listen on"
+    )
+    parser.add_argument(
+        "--socket", type=Path, help="Unix socket to listen on instead"
+    )
+    parser.add_argument(
+        "--poll-interval",
+        type=float,
+        default=POLL_INTERVAL,
+        help="Seconds between checks for a changed export",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Do not read or write the cache of parsed records",
+    )
+    parser.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        help="Number of worker processes used to parse the export",
+    )
+    parser.add_argument(
+        "--source-priority",
+        nargs="+",
+        help="Source names in order of preference for overlapping records",
+    )
+
+    args = parser.parse_args()
+    step_server = StepServer(
+        args.file_path,
+        LoadOptions(cache=not args.no_cache, workers=args.workers),
+        args.source_priority,
+        args.poll_interval,
+    )
+    try:
+        asyncio.run(step_server.serve(args.host, args.port, args.socket))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,90 @@
+"""Incremental step store.
+
+Keeps the daily step totals of previously ingested Apple Health exports,
+together with a high-water mark: the latest record end time seen so far.
+Exports are full snapshots, so when a new export arrives only the records
+ending after the mark are added to the stored totals. The step records of an
+``export.xml`` are sorted by start date, so the first one that may end after
+the mark is found by bisection over the new file and only the records from
+there on are parsed, making an update cost grow with the new data only. An
+``export.zip`` cannot be read from an offset and is parsed whole.
+"""
+
+import os
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+from daily_series import DailySeries
+from health_export import read_step_records
+
+
+def load_store(store_path: Path) -> Optional[tuple[DailySeries, int]]:
+    """Load the stored daily totals and high-water mark.
+
+    :param store_path: Path to the store file.
+    :return: Daily step series and high-water mark in seconds since the Unix
+        epoch, or `None` if there is no store yet.
+    """
+    if not store_path.is_file():
+        return None
+
+    with np.load(store_path) as store:
+        series = DailySeries.from_day_totals(store["days"], store["steps"])
+        return series, int(store["high_water_mark"])
+
+
+def save_store(
+    store_path: Path, series: DailySeries, high_water_mark: int
+) -> None:
+    """Save the daily totals and high-water mark.
+
+    The store is written to a temporary file first and then moved in place,
+    so an interrupted update keeps the previous store intact.
+
+    :param store_path: Path to the store file.
+    :param series: Daily step series.
+    :param high_water_mark: Latest ingested record end time, in seconds since
+        the Unix epoch.
+    """
+    temp_path = store_path.with_name(store_path.name + ".tmp")
+    with open(temp_path, "wb") as file:
+        np.savez(
+            file,
+            days=series.day_numbers()[series.recorded],
+            steps=series.steps[series.recorded],
+            high_water_mark=high_water_mark,
+        )
+    os.replace(temp_path, store_path)
+
+
+def update_store(
+    file_path: str, store_path: Path, workers: Optional[int] = None
+) -> DailySeries:
+    """Ingest the new records of an export into the store.
+
+    Records ending at or before the high-water mark were already counted from
+    an earlier export and are skipped, without being parsed if the export is
+    an ``export.xml``.
+
+    :param file_path: File path to health data.
+    :param store_path: Path to the store file.
+    :param workers: Number of worker processes used to parse the export.
+    :return: Daily step series with all ingested steps.
+    """
+    stored = load_store(store_path)
+    if stored is None:
+        series = DailySeries.from_day_totals([], [])
+        high_water_mark = None
+    else:
+        series, high_water_mark = stored
+
+    records = read_step_records(file_path, workers, since=high_water_mark)
+    if len(records) == 0:
+        return series
+
+    series = series.combine(DailySeries.from_records(records))
+    high_water_mark = max(high_water_mark or 0, int(records.end.max()))
+    save_store(store_path, series, high_water_mark)
+
+    return series
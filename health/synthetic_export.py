@@ -0,0 +1,282 @@
+"""Synthetic Apple Health export.
+
+Writes a deterministic ``export.xml`` in the Apple Health layout, for
+measuring the step count tools at realistic scale without a personal export.
+Records are generated and written in batches, so tens of millions of records
+can be produced with bounded memory.
+
+Usage:
+    python health/synthetic_export.py export.xml --records 10000000
+"""
+
+import argparse
+from datetime import date
+from pathlib import Path
+from typing import TextIO
+
+import numpy as np
+from health_export import STEP_COUNT_TYPE
+from timestamps import SECONDS_PER_DAY, parse_offset
+
+HEART_RATE_TYPE = "HKQuantityTypeIdentifierHeartRate"
+BATCH_SIZE = 100_000
+
+HEADER = """<?xml version="1.0" encoding="UTF-8"?>
+<!DOCTYPE HealthData [
+<!ELEMENT HealthData (ExportDate,Me,(Record|Correlation|Workout)*)>
+<!ATTLIST HealthData locale CDATA #REQUIRED>
+<!ELEMENT Record ((MetadataEntry|HeartRateVariabilityMetadataList)*)>
+<!ATTLIST Record
+  type          CDATA #REQUIRED
+  unit          CDATA #IMPLIED
+  value         CDATA #IMPLIED
+  sourceName    CDATA #REQUIRED
+  sourceVersion CDATA #IMPLIED
+  device        CDATA #IMPLIED
+  creationDate  CDATA #IMPLIED
+  startDate     CDATA #REQUIRED
+  endDate       CDATA #REQUIRED
+>
+]>
+<HealthData locale="en_US">
+ <ExportDate value="{export_date}"/>
+ <Me HKCharacteristicTypeIdentifierDateOfBirth=""/>
+"""
+FOOTER = "</HealthData>\n"
+
+
+def format_timestamps(seconds: np.ndarray, utc_offset: str) -> np.ndarray:
+    """Format local times in the Health timestamp layout.
+
+    :param seconds: Local times, in seconds since the Unix epoch.
+    :param utc_offset: UTC offset of the local times, as ``+HHMM``.
+    :return: Array of timestamp strings.
+    """
+    local = np.datetime_as_string(seconds.astype("M8[s]"), unit="s")
+    return np.char.add(np.char.replace(local, "T", " "), " " + utc_offset)
+
+
+def _write_records(
+    file: TextIO,
+    record_type: str,
+    unit: str,
+    sources: np.ndarray,
+    starts: np.ndarray,
+    ends: np.ndarray,
+    values: np.ndarray,
+    utc_offset: str,
+) -> None:
+    """Write a batch of records.
+
+    :param file: Export file to write to.
+    :param record_type: Type of the records.
+    :param unit: Unit of the record values.
+    :param sources: Source name of every record.
+    :param starts: Local start times, in seconds since the Unix epoch.
+    :param ends: Local end times, in seconds since the Unix epoch.
+    :param values: Value of every record.
+    :param utc_offset: UTC offset of the local times, as ``+HHMM``.
+    """
+    start_dates = format_timestamps(starts, utc_offset)
+    end_dates = format_timestamps(ends, utc_offset)
+    file.writelines(
+        f' <Record type="{record_type}" sourceName="{source}" '
+        f'unit="{unit}" creationDate="{end_date}" startDate="{start_date}" '
+        f'endDate="{end_date}" value="{value}"/>\n'
+        for source, start_date, end_date, value in zip(
+            sources.tolist(),
+            start_dates.tolist(),
+            end_dates.tolist(),
+            values.tolist(),
+        )
+    )
+
+
+def generate_export(
+    file_path: Path,
+    records: int = 1_000_000,
+    sources: tuple[str, ...] = ("iPhone", "Apple Watch"),
+    overlap: float = 0.3,
+    start: date = date(2015, 1, 1),
+    days: int = 3650,
+    heart_rate_ratio: float = 0.5,
+    utc_offset: str = "+0100",
+    seed: int = 0,
+) -> int:
+    """Write a synthetic export.
+
+    Step records are spread over the date span in chronological batches. A
+    share of them, given by ``overlap``, is recorded a second time by
+    another source over an overlapping interval, as happens with an iPhone
+    and an Apple Watch. Heart rate records follow the step records, as the
+    export groups records by type.
+
+    :param file_path: Path of the export to write.
+    :param records: Number of step records.
+    :param sources: Source names of the records.
+    :param overlap: Fraction of step records duplicated by another source,
+        between 0 and 1.
+    :param start: First day of the records.
+    :param days: Number of days spanned by the records.
+    :param heart_rate_ratio: Number of heart rate records per step record.
+    :param utc_offset: UTC offset of the record times, as ``+HHMM``.
+    :param seed: Seed of the random number generator.
+    :return: Number of records written.
+    """
+    if not 0 <= overlap <= 1:
+        raise ValueError("The overlap must be between 0 and 1.")
+    parse_offset(utc_offset)
+    rng = np.random.default_rng(seed)
+    source_names = np.array(sources)
+    first_second = (start - date(1970, 1, 1)).days * SECONDS_PER_DAY
+    span = days * SECONDS_PER_DAY
+    written = 0
+
+    with open(file_path, "w", encoding="utf-8") as file:
+        export_date = format_timestamps(
+            np.array([first_second + span]), utc_offset
+        )[0]
+        file.write(HEADER.format(export_date=export_date))
+
+        # Each batch covers its own slice of the date span, keeping the step
+        # records in chronological order.
+        batches = max(1, -(-records // BATCH_SIZE))
+        for batch in range(batches):
+            batch_records = (
+                records * (batch + 1) // batches - records * batch // batches
+            )
+            duplicates = 0
+            if len(sources) > 1:
+                duplicates = round(batch_records * overlap / (1 + overlap))
+            primaries = batch_records - duplicates
+
+            slice_start = first_second + span * batch // batches
+            slice_end = first_second + span * (batch + 1) // batches
+            starts = np.sort(rng.integers(slice_start, slice_end, primaries))
+            durations = rng.integers(60, 20 * 60, primaries)
+            values = rng.integers(10, 2000, primaries)
+            source_ids = rng.integers(0, len(sources), primaries)
+
+            # Another source records part of the same walk, over a shifted
+            # interval and with a slightly different step count.
+            duplicated = rng.choice(primaries, duplicates, replace=False)
+            shifts = rng.integers(
+                -durations[duplicated] // 2, durations[duplicated] // 2 + 1
+            )
+            other_ids = source_ids[duplicated] + rng.integers(
+                1, max(2, len(sources)), duplicates
+            )
+
+            batch_starts = np.concatenate(
+                [starts, starts[duplicated] + shifts]
+            )
+            batch_ends = batch_starts + np.concatenate(
+                [durations, durations[duplicated]]
+            )
+            batch_values = np.concatenate(
+                [values, rng.binomial(values[duplicated], 0.9)]
+            )
+            batch_sources = np.concatenate(
+                [source_ids, other_ids % len(sources)]
+            )
+            order = np.argsort(batch_starts, kind="stable")
+
+            _write_records(
+                file,
+                STEP_COUNT_TYPE,
+                "count",
+                source_names[batch_sources[order]],
+                batch_starts[order],
+                batch_ends[order],
+                batch_values[order],
+                utc_offset,
+            )
+            written += len(order)
+
+        heart_rate_records = int(written * heart_rate_ratio)
+        for batch_start in range(0, heart_rate_records, BATCH_SIZE):
+            count = min(BATCH_SIZE, heart_rate_records - batch_start)
+            starts = np.sort(
+                rng.integers(first_second, first_second + span, count)
+            )
+            _write_records(
+                file,
+                HEART_RATE_TYPE,
+                "count/min",
+                source_names[rng.integers(0, len(sources), count)],
+                starts,
+                starts,
+                rng.integers(50, 180, count),
+                utc_offset,
+            )
+            written += count
+
+        file.write(FOOTER)
+
+    return written
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Write a synthetic Apple Health export for benchmarks."
+    )
+    parser.add_argument("file_path", type=Path, help="Export file to write")
+    parser.add_argument(
+        "-n",
+        "--records",
+        type=int,
+        default=1_000_000,
+        help="Number of step records",
+    )
+    parser.add_argument(
+        "--sources",
+        nargs="+",
+        default=["iPhone", "Apple Watch"],
+        help="Source names of the records",
+    )
+    parser.add_argument(
+        "--overlap",
+        type=float,
+        default=0.3,
+        help="Fraction of step records duplicated by another source",
+    )
+    parser.add_argument(
+        "--start",
+        type=date.fromisoformat,
+        default=date(2015, 1, 1),
+        help="First day of the records, as YYYY-MM-DD",
+    )
+    parser.add_argument(
+        "--days",
+        type=int,
+        default=3650,
+        help="Number of days spanned by the records",
+    )
+    parser.add_argument(
+        "--heart-rate-ratio",
+        type=float,
+        default=0.5,
+        help="Number of heart rate records per step record",
+    )
+    parser.add_argument(
+        "--utc-offset",
+        default="+0100",
+        help="UTC offset of the record times, as +HHMM",
+    )
+    parser.add_argument(
+        "--seed", type=int, default=0, help="Random number generator seed"
+    )
+
+    args = parser.parse_args()
+    total = generate_export(
+        args.file_path,
+        args.records,
+        tuple(args.sources),
+        args.overlap,
+        args.start,
+        args.days,
+        args.heart_rate_ratio,
+        args.utc_offset,
+        args.seed,
+    )
+    print(f"Wrote {total} records to {args.file_path}")
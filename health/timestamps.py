@@ -0,0 +1,196 @@
+"""Health record timestamps.
+
+Fast parsers for the fixed ``YYYY-MM-DD HH:MM:SS +HHMM`` layout of Apple
+Health record dates. Exports contain millions of timestamps but only a few
+thousand distinct days and a handful of UTC offsets, so the day and offset
+parts are memoised. The results match ``datetime.strptime`` with
+``DATE_FORMAT``, which is used as a fallback for any other layout.
+"""
+
+import re
+from datetime import date, datetime
+from functools import lru_cache
+from typing import Sequence
+
+import numpy as np
+
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S %z"
+TIMESTAMP_LENGTH = len("2000-01-01 00:00:00 +0000")
+SECONDS_PER_DAY = 86400
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+TIMESTAMP_PATTERN = re.compile(
+    r"\d{4}-\d{2}-\d{2} ([01]\d|2[0-3]):[0-5]\d:[0-5]\d "
+    r"[+-]([01]\d|2[0-3])[0-5]\d",
+    re.ASCII,
+)
+# Code points of the fixed layout, with the digits as "0" and the offset
+# sign as "+", and how far above them each character may be.
+LAYOUT = np.array(
+    [ord(char) for char in "0000-00-00 00:00:00 +0000"], dtype=np.uint32
+)
+LAYOUT_RANGE = np.where(LAYOUT == ord("0"), 10, 1).astype(np.uint32)
+OFFSET_SIGN = 20
+
+
+def parse_iso_timestamp(value: str) -> datetime:
+    """Parse an ISO 8601 timestamp with a UTC offset.
+
+    :param value: Timestamp, e.g. 2024-01-01T00:00:00+01:00.
+    :return: Timezone-aware timestamp.
+    :raises ValueError: If the timestamp is invalid or has no UTC offset,
+        which would silently be read in the local timezone of the machine.
+    """
+    timestamp = datetime.fromisoformat(value)
+    if timestamp.tzinfo is None:
+        raise ValueError(f"Timestamp {value} has no UTC offset.")
+    return timestamp
+
+
+@lru_cache(maxsize=None)
+def parse_offset(offset: str) -> int:
+    """Parse a ``+HHMM`` UTC offset.
+
+    :param offset: UTC offset as written in the export.
+    :return: Offset in seconds.
+    """
+    if (
+        len(offset) != 5
+        or offset[0] not in "+-"
+        or not offset[1:].isascii()
+        or not offset[1:].isdigit()
+        or int(offset[1:3]) > 23
+        or int(offset[3:5]) > 59
+    ):
+        raise ValueError(f"Invalid UTC offset: {offset!r}")
+    seconds = int(offset[1:3]) * 3600 + int(offset[3:5]) * 60
+    return -seconds if offset[0] == "-" else seconds
+
+
+@lru_cache(maxsize=65536)
+def local_date(date_prefix: str) -> date:
+    """Parse the ``YYYY-MM-DD`` date part of a timestamp.
+
+    :param date_prefix: Date part of the timestamp.
+    :return: Local date.
+    """
+    return date.fromisoformat(date_prefix)
+
+
+def is_fixed_layout(timestamp: str) -> bool:
+    """Check whether a timestamp has the fixed layout of the fast parsers.
+
+    :param timestamp: Timestamp as written in the export.
+    :return: `True` if the timestamp has the ``YYYY-MM-DD HH:MM:SS +HHMM``
+        layout, otherwise `False`.
+    """
+    return TIMESTAMP_PATTERN.fullmatch(timestamp) is not None
+
+
+def _fixed_layout_mask(values: np.ndarray) -> np.ndarray:
+    """Check many timestamps for the fixed layout of the fast parsers.
+
+    :param values: Timestamps of ``TIMESTAMP_LENGTH`` characters.
+    :return: Boolean array, `True` where the digits, the separators and the
+        offset sign are in place.
+    """
+    # View the fixed-width strings as rows of their code points. Code points
+    # below the layout wrap around, so each is checked with one comparison.
+    characters = (
+        values.astype(f"U{TIMESTAMP_LENGTH}")
+        .view(np.uint32)
+        .reshape(-1, TIMESTAMP_LENGTH)
+    )
+    valid = characters - LAYOUT < LAYOUT_RANGE
+    valid[:, OFFSET_SIGN] |= characters[:, OFFSET_SIGN] == ord("-")
+    return np.all(valid, axis=1)
+
+
+def record_date(timestamp: str) -> date:
+    """Local date of a record timestamp.
+
+    :param timestamp: Timestamp as written in the export.
+    :return: Local date, as ``datetime.strptime(...).date()`` would give.
+    """
+    if not is_fixed_layout(timestamp):
+        return datetime.strptime(timestamp, DATE_FORMAT).date()
+    return local_date(timestamp[:10])
+
+
+def parse_timestamp(timestamp: str) -> tuple[int, int]:
+    """Parse a record timestamp.
+
+    :param timestamp: Timestamp as written in the export.
+    :return: Seconds since the Unix epoch and the UTC offset in seconds.
+    """
+    if not is_fixed_layout(timestamp):
+        parsed = datetime.strptime(timestamp, DATE_FORMAT)
+        return (
+            int(parsed.timestamp()),
+            int(parsed.utcoffset().total_seconds()),
+        )
+
+    day = local_date(timestamp[:10]).toordinal() - EPOCH_ORDINAL
+    local_seconds = (
+        day * SECONDS_PER_DAY
+        + int(timestamp[11:13]) * 3600
+        + int(timestamp[14:16]) * 60
+        + int(timestamp[17:19])
+    )
+    offset = parse_offset(timestamp[20:])
+    return local_seconds - offset, offset
+
+
+def parse_local_days(timestamps: Sequence[str]) -> np.ndarray:
+    """Local dates of many record timestamps at once.
+
+    :param timestamps: Timestamps as written in the export.
+    :return: Array of local dates as days since the Unix epoch.
+    """
+    values = np.asarray(timestamps, dtype=str)
+    if len(values) == 0:
+        return np.zeros(0, dtype=np.int32)
+    if np.any(np.char.str_len(values) != TIMESTAMP_LENGTH) or not np.all(
+        _fixed_layout_mask(values)
+    ):
+        return np.array(
+            [
+                record_date(timestamp).toordinal() - EPOCH_ORDINAL
+                for timestamp in values.tolist()
+            ],
+            dtype=np.int32,
+        )
+    return values.astype("U10").astype("M8[D]").astype(np.int32)
+
+
+def parse_timestamps(
+    timestamps: Sequence[str],
+) -> tuple[np.ndarray, np.ndarray]:
+    """Parse many record timestamps at once.
+
+    :param timestamps: Timestamps as written in the export.
+    :return: Seconds since the Unix epoch and UTC offsets in seconds.
+    """
+    values = np.asarray(timestamps, dtype=str)
+    if len(values) == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int32)
+    if np.any(np.char.str_len(values) != TIMESTAMP_LENGTH) or not np.all(
+        _fixed_layout_mask(values)
+    ):
+        seconds, offsets = zip(*map(parse_timestamp, values.tolist()))
+        return (
+            np.array(seconds, dtype=np.int64),
+            np.array(offsets, dtype=np.int32),
+        )
+
+    local_seconds = values.astype("U19").astype("M8[s]").astype(np.int64)
+    # Only a handful of distinct offsets occur, so parse each one once.
+    offset_strings, inverse = np.unique(
+        np.char.rpartition(values, " ")[:, 2], return_inverse=True
+    )
+    offset_seconds = np.array(
+        [parse_offset(offset) for offset in offset_strings.tolist()],
+        dtype=np.int32,
+    )
+    offsets = offset_seconds[inverse.reshape(-1)]
+
+    return local_seconds - offsets, offsets